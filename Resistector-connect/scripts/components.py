@@ -0,0 +1,127 @@
+from collections import deque, namedtuple
+
+ComponentType = namedtuple('ComponentType', ['name', 'distance', 'logic_layer', 'breadboard', 'confirmations', 'states'])
+ComponentType.__doc__ = """
+A component of the library.
+
+Attributes:
+    name (str): The component name, also the name of its image.
+    distance (int): The number of grid cells the component spans.
+    logic_layer (str): Conductivity of every cell on the logic layer, `X` or `O`.
+    breadboard (str): Conductivity of every cell on the breadboard, `X` or `O`.
+    confirmations (int): Frames the pattern has to be seen before the component is shown.
+    states (tuple): The display state of every cell (`O`, `X` or `XX`).
+"""
+
+DEFAULT_CONFIRMATIONS = 10
+
+
+def _cell_state(breadboard, logic_layer):
+    if breadboard == 'O':
+        if logic_layer == 'X':
+            raise ValueError("A cell conductive only on the logic layer cannot be displayed")
+        return 'O'
+    return 'XX' if logic_layer == 'X' else 'X'
+
+
+def load_component_library(path):
+    """
+    Loads the component library. Every component is a line `Name:` followed by indented
+    `Key: Value` lines for Distance, LogicLayer, Breadboard and optionally Confirmations.
+    Other lines, like the legend, are ignored. Components listed first are detected first.
+
+    Args:
+        path (str): The path of the library file.
+
+    Returns:
+        list: The ComponentType of every component, in file order.
+
+    Raises:
+        ValueError: If a component is incomplete or inconsistent.
+    """
+    entries = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            if not line[0].isspace() and line.rstrip().endswith(':'):
+                entries.append((line.strip()[:-1].strip(), {}))
+            elif line[0].isspace() and entries:
+                key, _, value = line.partition(':')
+                entries[-1][1][key.strip().lower()] = value.strip()
+
+    library = []
+    for name, options in entries:
+        try:
+            distance = int(options['distance'])
+            logic_layer = options['logiclayer'].upper()
+            breadboard = options['breadboard'].upper()
+            confirmations = int(options.get('confirmations', DEFAULT_CONFIRMATIONS))
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Invalid component {name} in {path}: {e}") from e
+        if not len(logic_layer) == len(breadboard) == distance:
+            raise ValueError(f"Invalid component {name} in {path}: LogicLayer and Breadboard need {distance} cells")
+        if set(logic_layer + breadboard) - {'X', 'O'}:
+            raise ValueError(f"Invalid component {name} in {path}: cells have to be X or O")
+        states = tuple(_cell_state(board, logic) for board, logic in zip(breadboard, logic_layer))
+        library.append(ComponentType(name, distance, logic_layer, breadboard, confirmations, states))
+    return library
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over sequences of cell codes. Finds every occurrence of all
+    patterns in one pass over a sequence, independent of the number of patterns.
+
+    Attributes:
+        patterns (list): The patterns as tuples of codes.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = [tuple(pattern) for pattern in patterns]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for code in pattern:
+                if code not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][code] = len(self.goto) - 1
+                state = self.goto[state][code]
+            self.output[state].append(index)
+
+        # Breadth-first over the trie, so the failure state of a parent is known first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for code, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and code not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(code, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        self.codes = {code for pattern in self.patterns for code in pattern}
+
+    def search(self, sequence):
+        """
+        Finds all pattern occurrences in a sequence.
+
+        Args:
+            sequence (iterable): The codes to search.
+
+        Returns:
+            list: (start position, pattern index) of every occurrence.
+        """
+        matches = []
+        state = 0
+        for position, code in enumerate(sequence):
+            while state and code not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(code, 0)
+            for index in self.output[state]:
+                matches.append((position - len(self.patterns[index]) + 1, index))
+        return matches
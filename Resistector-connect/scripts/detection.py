@@ -0,0 +1,525 @@
+import numpy as np
+from topology import channel_index
+from components import PatternMatcher
+
+# Display states of a grid cell: non-conductive, conductive on the breadboard and conductive on
+# the breadboard and the logic layer. Grids store the index of the state.
+STATE_NAMES = ('O', 'X', 'XX')
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+HORIZONTAL, VERTICAL = 0, 1
+OCCUPIED = -1  # Code of cells that belong to a detected component, part of no pattern
+
+
+def frame_to_array(records, topology):
+    """
+    Converts measurement records into a clients x channels array. The row of a record is the
+    topology index of its client, the column the number of the channel.
+
+    Args:
+        records (list): Normalized measurement records.
+        topology (Topology): The client topology.
+
+    Returns:
+        numpy.ndarray: The values, NaN for missing samples and clients without record.
+    """
+    values = np.full((len(topology.clients), topology.max_channels), np.nan)
+    for record in records:
+        role = topology.role(record.get('pi-address'))
+        if role is None:
+            continue
+        for channel, value in record['sensor_data'].items():
+            column = channel_index(channel)
+            if column < topology.max_channels:
+                values[role.index, column] = value
+    return values
+
+
+class Baseline:
+    """
+    Per-channel baseline of the latest samples, kept as a preallocated ring of shape
+    clients x channels x window. Running sums and sums of squares make the means and
+    variances of all channels available without touching the windows.
+
+    Attributes:
+        window (int): The number of samples kept per channel.
+        ring (numpy.ndarray): The samples, 0 in unused slots.
+        position (numpy.ndarray): Per channel the ring slot written next.
+        count (numpy.ndarray): Per channel the number of samples in the window.
+        sums (numpy.ndarray): Per channel the sum of the samples in the window.
+        sums_sq (numpy.ndarray): Per channel the sum of the squared samples in the window.
+    """
+
+    RESYNC_INTERVAL = 1000  # Appends after which the running sums are recomputed exactly
+
+    def __init__(self, clients, channels, window=50):
+        self.window = window
+        self.ring = np.zeros((clients, channels, window))
+        self.position = np.zeros((clients, channels), dtype=np.int64)
+        self.count = np.zeros((clients, channels), dtype=np.int64)
+        self.sums = np.zeros((clients, channels))
+        self.sums_sq = np.zeros((clients, channels))
+        self.appends = 0
+
+    def is_empty(self):
+        """
+        Checks whether no channel has a sample yet.
+        """
+        return not self.count.any()
+
+    def clear(self):
+        """
+        Removes all samples.
+        """
+        self.ring.fill(0.0)
+        self.position.fill(0)
+        self.count.fill(0)
+        self.sums.fill(0.0)
+        self.sums_sq.fill(0.0)
+
+    def append(self, values):
+        """
+        Appends one sample to every channel with a valid value. Full windows drop their
+        oldest sample.
+
+        Args:
+            values (numpy.ndarray): The samples of shape clients x channels, NaN to skip a channel.
+        """
+        clients, channels = np.nonzero(~np.isnan(values))
+        if clients.size == 0:
+            return
+        slots = self.position[clients, channels]
+        new = values[clients, channels]
+        old = self.ring[clients, channels, slots]
+        self.sums[clients, channels] += new - old
+        self.sums_sq[clients, channels] += new * new - old * old
+        self.ring[clients, channels, slots] = new
+        self.position[clients, channels] = (slots + 1) % self.window
+        self.count[clients, channels] = np.minimum(self.count[clients, channels] + 1, self.window)
+
+        self.appends += 1
+        if self.appends % self.RESYNC_INTERVAL == 0:
+            # Running sums accumulate rounding errors, unused slots are 0 and do not contribute
+            self.sums = self.ring.sum(axis=2)
+            self.sums_sq = (self.ring * self.ring).sum(axis=2)
+
+    def means(self):
+        """
+        Returns the mean of every channel.
+
+        Returns:
+            numpy.ndarray: The means of shape clients x channels, NaN for channels without samples.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sums / self.count, np.nan)
+
+    def variances(self):
+        """
+        Returns the (population) variance of every channel.
+
+        Returns:
+            numpy.ndarray: The variances of shape clients x channels, NaN for channels without samples.
+        """
+        means = self.means()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variances = np.where(self.count > 0, self.sums_sq / self.count - means * means, np.nan)
+        return np.maximum(variances, 0.0, where=~np.isnan(variances), out=variances)
+
+
+class RunningStatistics:
+    """
+    Online mean and variance of every channel over all samples seen, updated with Welford's
+    algorithm, which stays numerically stable for small variances on a large offset.
+
+    Attributes:
+        count (numpy.ndarray): Per channel the number of samples.
+        mean (numpy.ndarray): Per channel the mean of the samples.
+        m2 (numpy.ndarray): Per channel the sum of squared deviations from the mean.
+    """
+
+    def __init__(self, clients, channels):
+        self.count = np.zeros((clients, channels), dtype=np.int64)
+        self.mean = np.zeros((clients, channels))
+        self.m2 = np.zeros((clients, channels))
+
+    def update(self, values):
+        """
+        Adds one sample to every channel with a valid value.
+
+        Args:
+            values (numpy.ndarray): The samples of shape clients x channels, NaN to skip a channel.
+        """
+        valid = ~np.isnan(values)
+        self.count += valid
+        delta = np.where(valid, values - self.mean, 0.0)
+        self.mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=valid)
+        self.m2 += np.where(valid, delta * (np.where(valid, values, 0.0) - self.mean), 0.0)
+
+    def variances(self):
+        """
+        Returns the sample variance of every channel.
+
+        Returns:
+            numpy.ndarray: The variances, NaN for channels with less than two samples.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def confidence_width(self, z):
+        """
+        Returns the width of the confidence interval of every channel mean.
+
+        Args:
+            z (float): The quantile of the standard normal distribution, e.g. 1.96 for 95 %.
+
+        Returns:
+            numpy.ndarray: The widths, NaN for channels with less than two samples.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return 2 * z * np.sqrt(self.variances() / self.count)
+
+
+class HysteresisRegisters:
+    """
+    Hysteresis state of every channel, kept as integer arrays of shape clients x channels.
+
+    - `counter` counts consecutive frames below (negative) or above (positive) the
+      threshold band and is reset to 0 by a frame within the band.
+    - `level` is the detected level of a channel, -1 below and 1 above the baseline.
+    - `lifetime` is the number of frames a detected level stays active, 0 if inactive.
+
+    Attributes:
+        counter (numpy.ndarray): The hysteresis counters.
+        level (numpy.ndarray): The detected levels.
+        lifetime (numpy.ndarray): The remaining lifetimes of the detected levels.
+    """
+
+    LIFETIME = 10  # Frames a detected level stays active
+
+    def __init__(self, clients, channels):
+        self.counter = np.zeros((clients, channels), dtype=np.int32)
+        self.level = np.zeros((clients, channels), dtype=np.int8)
+        self.lifetime = np.zeros((clients, channels), dtype=np.int16)
+
+    def count(self, deviation, valid):
+        """
+        Advances the counters of all valid channels by one frame.
+
+        Args:
+            deviation (numpy.ndarray): -1 below, 1 above and 0 within the threshold band.
+            valid (numpy.ndarray): Mask of the channels with a sample and a baseline.
+        """
+        self.counter = np.where(valid, np.where(deviation != 0, self.counter + deviation, 0), self.counter).astype(np.int32)
+
+    def detect(self, hysteresis, valid):
+        """
+        Turns the counters that reached `hysteresis` into detected levels. A new level is
+        active for LIFETIME frames, a level that is still active keeps its lifetime.
+
+        Args:
+            hysteresis (int): The number of frames needed for a detection.
+            valid (numpy.ndarray): Mask of the channels counted in this frame.
+
+        Returns:
+            numpy.ndarray: Mask of the channels that crossed the hysteresis.
+        """
+        up = valid & (self.counter >= hysteresis)
+        down = valid & (self.counter <= -hysteresis)
+        crossed = up | down
+        self.counter[crossed] = 0
+        self.lifetime[crossed & (self.lifetime <= 0)] = self.LIFETIME
+        self.level[up] = 1
+        self.level[down] = -1
+        return crossed
+
+    def decay(self):
+        """
+        Reduces the lifetime of all active levels by one frame and clears expired ones.
+        """
+        active = self.lifetime > 0
+        self.lifetime[active] -= 1
+        self.level[self.lifetime <= 0] = 0
+
+    def active(self):
+        """
+        Returns the mask of the channels with an active level.
+        """
+        return self.lifetime > 0
+
+
+class GridStore:
+    """
+    Display state codes of a board. Small boards are stored as a dense int8 array, large
+    boards as a dict of the conductive cells keyed by `x * y_dim + y`. The store records
+    which cells changed, so consumers only have to look at those.
+
+    Attributes:
+        shape (tuple): The grid size (x_dim, y_dim).
+        dense (bool): Whether the cells are stored in a dense array.
+        changed (set): Keys of the cells changed since the last `take_changes`.
+    """
+
+    DENSE_LIMIT = 65536  # Largest number of cells stored densely
+
+    def __init__(self, x_dim, y_dim, dense_limit=None):
+        self.shape = (x_dim, y_dim)
+        self.dense = x_dim * y_dim <= (self.DENSE_LIMIT if dense_limit is None else dense_limit)
+        self.cells = np.zeros(self.shape, dtype=np.int8) if self.dense else {}
+        self.changed = set()
+        self._array = None
+
+    def assign(self, xs, ys, codes):
+        """
+        Sets the cells of the region spanned by some columns and rows.
+
+        Args:
+            xs (numpy.ndarray): The x coordinates of the region.
+            ys (numpy.ndarray): The y coordinates of the region.
+            codes (numpy.ndarray): The state codes of shape len(xs) x len(ys).
+        """
+        if len(xs) == 0 or len(ys) == 0:
+            return
+        y_dim = self.shape[1]
+        if self.dense:
+            region = np.ix_(xs, ys)
+            differs = self.cells[region] != codes
+            if differs.any():
+                rows, columns = np.nonzero(differs)
+                self.changed.update((xs[rows] * y_dim + ys[columns]).tolist())
+                self.cells[region] = codes
+            return
+        for key, code in zip((xs[:, None] * y_dim + ys[None, :]).ravel().tolist(), codes.ravel().tolist()):
+            if self.cells.get(key, 0) != code:
+                self.changed.add(key)
+                if code:
+                    self.cells[key] = code
+                else:
+                    del self.cells[key]
+                self._array = None
+
+    def array(self):
+        """
+        Returns the state codes as dense array. Must not be modified.
+        """
+        if self.dense:
+            return self.cells
+        if self._array is None:
+            self._array = np.zeros(self.shape, dtype=np.int8)
+            if self.cells:
+                keys = np.fromiter(self.cells.keys(), dtype=np.int64, count=len(self.cells))
+                self._array.flat[keys] = np.fromiter(self.cells.values(), dtype=np.int8, count=len(self.cells))
+        return self._array
+
+    def code(self, x, y):
+        """
+        Returns the state code of a cell.
+        """
+        if self.dense:
+            return int(self.cells[x, y])
+        return self.cells.get(x * self.shape[1] + y, 0)
+
+    def take_changes(self):
+        """
+        Returns the cells changed since the last call.
+
+        Returns:
+            list: (x, y, code) of every changed cell.
+        """
+        y_dim = self.shape[1]
+        changes = [(key // y_dim, key % y_dim, self.code(key // y_dim, key % y_dim)) for key in sorted(self.changed)]
+        self.changed = set()
+        return changes
+
+    def resized(self, x_dim, y_dim):
+        """
+        Returns a store of another size with the cells both sizes have in common.
+        """
+        store = GridStore(x_dim, y_dim)
+        old = self.array()
+        width, height = min(x_dim, self.shape[0]), min(y_dim, self.shape[1])
+        xs, ys = np.arange(width), np.arange(height)
+        store.assign(xs, ys, old[:width, :height])
+        store.changed = set()
+        return store
+
+
+class ComponentDetector:
+    """
+    Detects components in a grid of display states. All patterns are matched at once by an
+    Aho-Corasick automaton running over every row and column (on a sparse grid only over the
+    runs of conductive cells), occupied cells are taken from a label map. A component is
+    added once its pattern was seen at the same cells in `required_counts` frames and is
+    kept until one of its cells becomes non-conductive.
+    Components are identified by small integers that are never reused.
+
+    Attributes:
+        patterns (list): (name, state codes) per component type, in detection priority.
+        required_counts (dict): Frames a pattern has to be seen per component type.
+        detection_counter (dict): Frames seen per (component type, cells), cleared on every detection.
+        components (dict): The detected components per id.
+        next_id (int): The id of the next detected component.
+    """
+
+    DEFAULT_REQUIRED_COUNT = 10
+
+    def __init__(self, patterns, required_counts):
+        self.patterns = [(name, tuple(STATE_CODES[state] for state in states)) for name, states in patterns]
+        self.matcher = PatternMatcher([codes for _, codes in self.patterns])
+        # Without non-conductive cells in any pattern only runs of conductive cells can match
+        self.runs_only = STATE_CODES['O'] not in self.matcher.codes
+        self.min_length = min((len(codes) for _, codes in self.patterns), default=1)
+        self.required_counts = required_counts
+        self.detection_counter = {}
+        self.components = {}
+        self.next_id = 1
+
+    def remove_vanished(self, grid):
+        """
+        Removes the components of which at least one cell is no longer conductive.
+
+        Args:
+            grid (GridStore): The display state codes.
+        """
+        x_dim, y_dim = grid.shape
+        kept = {}
+        for component_id, component in self.components.items():
+            if all(x < x_dim and y < y_dim and grid.code(x, y) for x, y in component['coordinates']):
+                kept[component_id] = component
+        self.components = kept
+
+    def label(self):
+        """
+        Returns the labels of the cells occupied by detected components.
+
+        Returns:
+            dict: The 1-based number of its component per occupied (x, y) cell.
+        """
+        labels = {}
+        for number, component in enumerate(self.components.values(), 1):
+            for cell in component['coordinates']:
+                labels[cell] = number
+        return labels
+
+    def candidates(self, grid, labels):
+        """
+        Finds all free positions matching a pattern. On a sparse grid only the conductive
+        cells are looked at, unless a pattern contains non-conductive cells.
+
+        Args:
+            grid (GridStore): The display state codes.
+            labels (dict): The labels of the cells occupied by detected components.
+
+        Returns:
+            list: (x, y, pattern index, orientation) of every match, in scan order.
+        """
+        if grid.dense or not self.runs_only:
+            lines = grid.array().copy()
+            for x, y in labels:
+                lines[x, y] = OCCUPIED
+            oriented_lines = ((HORIZONTAL, 0, lines.T), (VERTICAL, 1, lines))
+            segments = [(orientation, axis, self._dense_segments(oriented)) for orientation, axis, oriented in oriented_lines]
+        else:
+            segments = self._sparse_segments(grid, labels)
+        matches = []
+        for orientation, axis, runs in segments:
+            # Horizontal patterns run along x (one line per y), vertical ones along y
+            for line, start, codes in runs:
+                for offset, index in self.matcher.search(codes):
+                    position = start + offset
+                    x, y = (position, line) if axis == 0 else (line, position)
+                    matches.append((int(x), int(y), index, orientation))
+        # Scan order of the grid: column by column, then pattern priority, horizontal first
+        matches.sort()
+        return matches
+
+    def _dense_segments(self, lines):
+        """Returns (line, start, codes) of the parts of a dense array that can contain a match."""
+        return [(line, start, lines[line, start:end].tolist()) for line, start, end in self._segments(lines)]
+
+    def _sparse_segments(self, grid, labels):
+        """
+        Returns the runs of free conductive cells of a sparse grid long enough for a pattern,
+        as (orientation, axis, [(line, start, codes)]) for both orientations.
+        """
+        x_dim, y_dim = grid.shape
+        free = [(key, code) for key, code in grid.cells.items() if (key // y_dim, key % y_dim) not in labels]
+        keys = np.fromiter((key for key, _ in free), dtype=np.int64, count=len(free))
+        codes = np.fromiter((code for _, code in free), dtype=np.int8, count=len(free))
+        segments = []
+        # Keys are x * y_dim + y, i.e. ordered along y; transposed ones are ordered along x
+        for orientation, axis, ordered, width in ((HORIZONTAL, 0, keys % y_dim * x_dim + keys // y_dim, x_dim),
+                                                  (VERTICAL, 1, keys, y_dim)):
+            order = np.argsort(ordered, kind='stable')
+            ordered, ordered_codes = ordered[order], codes[order]
+            breaks = np.flatnonzero((np.diff(ordered) != 1) | (ordered[1:] % width == 0)) + 1
+            starts = np.concatenate(([0], breaks)) if len(ordered) else breaks
+            ends = np.concatenate((breaks, [len(ordered)])) if len(ordered) else breaks
+            runs = []
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if end - start >= self.min_length:
+                    line, position = divmod(int(ordered[start]), width)
+                    runs.append((line, position, ordered_codes[start:end].tolist()))
+            segments.append((orientation, axis, runs))
+        return segments
+
+    def _segments(self, lines):
+        """
+        Returns the (line, start, end) parts of the lines that can contain a match: whole lines,
+        or only the runs of conductive cells long enough for a pattern.
+        """
+        if not self.runs_only:
+            return [(line, 0, lines.shape[1]) for line in range(lines.shape[0])]
+        conductive = np.zeros((lines.shape[0], lines.shape[1] + 2), dtype=np.int8)
+        conductive[:, 1:-1] = lines > 0
+        edges = np.diff(conductive, axis=1)
+        starts = np.argwhere(edges == 1)
+        ends = np.argwhere(edges == -1)
+        # Both are ordered line by line, so the n-th start belongs to the n-th end
+        long_enough = ends[:, 1] - starts[:, 1] >= self.min_length
+        return [(int(line), int(start), int(end)) for (line, start), (_, end) in zip(starts[long_enough], ends[long_enough])]
+
+    def detect(self, grid):
+        """
+        Runs the detection on one frame.
+
+        Args:
+            grid (GridStore): The display state codes.
+
+        Returns:
+            dict: The detected components per id.
+        """
+        self.remove_vanished(grid)
+        labels = self.label()
+        components = dict(self.components)
+        number = len(components)
+
+        for x, y, index, orientation in self.candidates(grid, labels):
+            name, codes = self.patterns[index]
+            length = len(codes)
+            if orientation == HORIZONTAL:
+                coordinates = [(x + i, y) for i in range(length)]
+            else:
+                coordinates = [(x, y + i) for i in range(length)]
+            # Components found earlier in this frame may occupy the cells by now
+            if any(cell in labels for cell in coordinates):
+                continue
+
+            key = (name, tuple(coordinates))
+            count = self.detection_counter[key] = self.detection_counter.get(key, 0) + 1
+            if count < self.required_counts.get(name, self.DEFAULT_REQUIRED_COUNT):
+                continue
+
+            components[self.next_id] = {
+                'type': name,
+                'x': x + length - 1 if orientation == HORIZONTAL else x,
+                'y': y if orientation == HORIZONTAL else y + length // 2,
+                'orientation': 'horizontal' if orientation == HORIZONTAL else 'vertical',
+                'coordinates': coordinates
+            }
+            self.detection_counter.clear()
+            self.next_id += 1
+            number += 1
+            for cell in coordinates:
+                labels[cell] = number
+
+        self.components = components
+        return components
@@ -0,0 +1,451 @@
+import json
+import time
+import socket
+import struct
+import logging
+import threading
+from collections import OrderedDict, deque
+
+# Every message on the bus is a 4 byte big-endian length followed by a UTF-8 JSON payload
+HEADER = struct.Struct('!I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+DEFAULT_HOST = '127.0.0.1'
+POLICIES = ('conflate', 'drop', 'block')
+
+
+def encode_message(message):
+    """
+    Encodes a message as a length-prefixed frame.
+
+    Args:
+        message (dict): The JSON serializable message.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(len(payload)) + payload
+
+
+def _recv_exactly(sock, size):
+    """
+    Reads exactly `size` bytes from the socket.
+
+    Args:
+        sock (socket.socket): The connected socket.
+        size (int): The number of bytes to read.
+
+    Returns:
+        bytes: The received bytes, or None if the connection was closed.
+    """
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def read_message(sock):
+    """
+    Reads one length-prefixed message from the socket.
+
+    Args:
+        sock (socket.socket): The connected socket.
+
+    Returns:
+        dict: The decoded message, or None if the connection was closed.
+
+    Raises:
+        ValueError: If the announced message size is out of bounds.
+    """
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {size} bytes exceeds the bus limit")
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+
+class _Subscription:
+    """
+    Publisher side state of one connected subscriber.
+
+    Frames are queued in a bounded outbox and written by a dedicated sender thread. With
+    the `conflate` policy the outbox keeps only the newest frame per client, with the `drop`
+    policy a subscriber whose outbox overflows is disconnected. Both never block the
+    publishing thread. The `block` policy is lossless: a full outbox makes the publisher
+    wait (backpressure), and only a subscriber that makes no progress for BLOCK_TIMEOUT
+    seconds is disconnected.
+    """
+
+    BLOCK_TIMEOUT = 10.0
+
+    def __init__(self, sock, address, clients, channels, policy, queue_size, on_close):
+        self.sock = sock
+        self.address = address
+        self.clients = set(clients) if clients else None
+        self.channels = set(channels) if channels else None
+        self.policy = policy
+        self.queue_size = queue_size
+        self.on_close = on_close
+        self.outbox = OrderedDict() if policy == 'conflate' else deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.sending = False
+        self.conflated = 0
+
+    def select(self, frame):
+        """
+        Applies the client and channel filter of this subscription to a frame.
+
+        Args:
+            frame (dict): A measurement record.
+
+        Returns:
+            dict: The filtered frame, or None if the subscriber is not interested in it.
+        """
+        if 'type' in frame:
+            # Status messages are not bound to a client and reach every subscriber
+            return frame
+        if self.clients is not None and frame.get('pi-address') not in self.clients:
+            return None
+        if self.channels is None or not isinstance(frame.get('sensor_data'), dict):
+            return frame
+        selected = dict(frame)
+        selected['sensor_data'] = {channel: value for channel, value in frame['sensor_data'].items() if channel in self.channels}
+        return selected
+
+    def offer(self, frame):
+        """
+        Queues a frame, waiting for room only with the `block` policy.
+
+        Args:
+            frame (dict): The filtered frame.
+
+        Returns:
+            bool: False if the subscriber had to be dropped.
+        """
+        with self.condition:
+            if self.closed:
+                return False
+            if self.policy == 'conflate':
+                key = frame.get('pi-address')
+                if key in self.outbox:
+                    self.conflated += 1
+                    del self.outbox[key]
+                elif len(self.outbox) >= self.queue_size:
+                    self.outbox.popitem(last=False)
+                    self.conflated += 1
+                self.outbox[key] = frame
+            elif self.policy == 'block':
+                while len(self.outbox) >= self.queue_size and not self.closed:
+                    if not self.condition.wait(self.BLOCK_TIMEOUT) and len(self.outbox) >= self.queue_size:
+                        logging.warning(f"Dropping stalled bus subscriber {self.address}")
+                        self.closed = True
+                        self.condition.notify_all()
+                        return False
+                if self.closed:
+                    return False
+                self.outbox.append(frame)
+            else:
+                if len(self.outbox) >= self.queue_size:
+                    logging.warning(f"Dropping slow bus subscriber {self.address}")
+                    self.closed = True
+                    self.condition.notify()
+                    return False
+                self.outbox.append(frame)
+            self.condition.notify_all()
+        return True
+
+    def _next_frame(self):
+        with self.condition:
+            while not self.outbox and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return None
+            # Wakes up a publisher waiting for room in a full outbox
+            self.condition.notify_all()
+            self.sending = True
+            if self.policy == 'conflate':
+                return self.outbox.popitem(last=False)[1]
+            return self.outbox.popleft()
+
+    def run(self):
+        """
+        Sender loop of the subscription. Runs until the subscriber disconnects or is dropped.
+        """
+        try:
+            while True:
+                frame = self._next_frame()
+                sock = self.sock
+                if frame is None or sock is None:
+                    break
+                sock.sendall(encode_message(frame))
+                with self.condition:
+                    self.sending = False
+                    self.condition.notify_all()
+        except OSError as e:
+            logging.info(f"Bus subscriber {self.address} disconnected: {e}")
+        finally:
+            self.close()
+
+    def drain(self, deadline):
+        """
+        Waits until every queued frame was written to the socket, the subscription is closed
+        or the deadline passed.
+
+        Args:
+            deadline (float): The latest `time.monotonic()` to wait until.
+
+        Returns:
+            bool: True if the outbox was drained.
+        """
+        with self.condition:
+            while (self.outbox or self.sending) and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return not self.outbox
+
+    def close(self):
+        """
+        Closes the subscription and its socket.
+        """
+        with self.condition:
+            already_closed = self.closed and self.sock is None
+            self.closed = True
+            self.condition.notify_all()
+            sock, self.sock = self.sock, None
+        if already_closed:
+            return
+        if sock is not None:
+            try:
+                # Sends the end of stream even while the registration thread still reads from the socket
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self.on_close(self)
+
+
+class FramePublisher:
+    """
+    Local publish/subscribe endpoint for measurement frames.
+
+    Subscribers connect over localhost TCP and send one subscription message
+    (`{"clients": [...], "channels": [...], "policy": ...}`, all optional) before receiving
+    a stream of length-prefixed frames. A subscriber that has to see every frame asks for
+    the `block` policy, the others get the slow subscriber policy of the publisher. Frames are measurement records, messages carrying a `type`
+    key are status messages. Messages sent by a subscriber after the subscription are
+    handed to `on_message`.
+
+    Attributes:
+        host (str): The interface the endpoint is bound to.
+        port (int): The TCP port of the endpoint.
+        policy (str): Default slow subscriber policy, `conflate`, `drop` or `block`.
+        queue_size (int): Maximum number of frames queued per subscriber.
+        on_message (callable): Called with every message received from a subscriber.
+        status (dict): The last published status message, replayed to new subscribers.
+    """
+
+    def __init__(self, port, host=DEFAULT_HOST, policy='conflate', queue_size=64, on_message=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow subscriber policy: {policy}")
+        self.host = host
+        self.port = port
+        self.policy = policy
+        self.queue_size = queue_size
+        self.on_message = on_message
+        self.status = None
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.server_socket = None
+
+    def start(self):
+        """
+        Binds the endpoint and starts accepting subscribers in a background thread.
+        """
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logging.info(f"Frame bus listening on {self.host}:{self.port}")
+
+    def _accept_loop(self):
+        while self.server_socket is not None:
+            try:
+                sock, address = self.server_socket.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._register, args=(sock, address), daemon=True).start()
+
+    def _register(self, sock, address):
+        try:
+            sock.settimeout(5)
+            request = read_message(sock) or {}
+            sock.settimeout(None)
+            policy = request.get('policy') or self.policy
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown slow subscriber policy: {policy}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Invalid bus subscription from {address}: {e}")
+            sock.close()
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        subscription = _Subscription(sock, address, request.get('clients'), request.get('channels'), policy, self.queue_size, self._unregister)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        logging.info(f"Bus subscriber {address} registered (clients={request.get('clients')}, channels={request.get('channels')}, policy={policy})")
+        if self.status is not None:
+            subscription.offer(self.status)
+        threading.Thread(target=subscription.run, daemon=True).start()
+        try:
+            while True:
+                message = read_message(sock)
+                if message is None:
+                    break
+                if self.on_message is not None:
+                    self.on_message(message)
+        except (OSError, ValueError):
+            pass
+        finally:
+            subscription.close()
+
+    def _unregister(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def publish(self, frame):
+        """
+        Fans a frame out to all interested subscribers. Only waits for subscribers with the
+        `block` policy.
+
+        Args:
+            frame (dict): A measurement record.
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            selected = subscription.select(frame)
+            if selected is not None and not subscription.offer(selected):
+                subscription.close()
+
+    def publish_status(self, status):
+        """
+        Publishes a status message to all subscribers and keeps it for new ones.
+
+        Args:
+            status (dict): The status values, e.g. the current sampling interval.
+        """
+        self.status = dict(status, type='status')
+        self.publish(self.status)
+
+    def drain(self, timeout):
+        """
+        Waits until all subscribers received the frames queued for them, at most `timeout`
+        seconds, e.g. before closing the bus at the end of a replay.
+
+        Args:
+            timeout (float): Maximum seconds to wait for all subscribers together.
+
+        Returns:
+            bool: True if every outbox was drained.
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        return all([subscription.drain(deadline) for subscription in subscriptions])
+
+    def close(self):
+        """
+        Stops accepting subscribers and disconnects all current ones.
+        """
+        server_socket, self.server_socket = self.server_socket, None
+        if server_socket is not None:
+            server_socket.close()
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class FrameSubscriber:
+    """
+    Client side of the frame bus.
+
+    Attributes:
+        port (int): The TCP port of the publisher.
+        host (str): The host of the publisher.
+        clients (list): Client addresses to receive, None for all.
+        channels (list): Channel names to receive, None for all.
+        policy (str): The slow subscriber policy to ask for, None for the publisher default.
+    """
+
+    def __init__(self, port, host=DEFAULT_HOST, clients=None, channels=None, timeout=None, policy=None):
+        self.port = port
+        self.host = host
+        self.clients = list(clients) if clients else None
+        self.channels = list(channels) if channels else None
+        self.timeout = timeout
+        self.policy = policy
+        self.sock = None
+
+    def connect(self):
+        """
+        Connects to the publisher and sends the subscription filter.
+
+        Raises:
+            OSError: If the publisher is not reachable.
+        """
+        self.sock = socket.create_connection((self.host, self.port), timeout=5)
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(encode_message({'clients': self.clients, 'channels': self.channels, 'policy': self.policy}))
+
+    def receive(self):
+        """
+        Blocks until the next frame arrives.
+
+        Returns:
+            dict: The next frame, or None if the publisher closed the connection.
+        """
+        if self.sock is None:
+            self.connect()
+        return read_message(self.sock)
+
+    def send(self, message):
+        """
+        Sends a message back to the publisher, e.g. an activity hint.
+
+        Args:
+            message (dict): The JSON serializable message.
+        """
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(encode_message(message))
+
+    def __iter__(self):
+        while True:
+            frame = self.receive()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self):
+        """
+        Closes the connection to the publisher.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
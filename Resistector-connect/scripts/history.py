@@ -0,0 +1,405 @@
+import time
+import logging
+import threading
+import numpy as np
+from measurementData import records_to_arrays, drop_gaps, SessionTailReader
+
+ROLLUP_WIDTHS = (5, 30, 180, 1800)  # Bucket widths of the rollup levels in seconds, finest first
+RAW_WINDOW = 3600  # Seconds of raw samples kept, older ranges are answered from the rollups
+MODES = ('minmax', 'lttb')
+_SECOND = 1_000_000  # Timestamps are kept as microseconds
+
+
+class _Series:
+    """
+    Column arrays of a time series that grow by doubling their capacity. Rows are appended
+    at the end, only the last row can be updated.
+
+    Attributes:
+        size (int): The number of rows.
+        arrays (dict): The column arrays per name, with spare capacity.
+    """
+
+    def __init__(self, channels, columns):
+        self.size = 0
+        self.arrays = {name: np.empty((16,) if name == 'time' else (16, channels), dtype=dtype) for name, dtype in columns.items()}
+
+    def __getitem__(self, name):
+        return self.arrays[name][:self.size]
+
+    def extend(self, rows):
+        """Appends rows given as arrays per column."""
+        amount = len(rows['time'])
+        capacity = len(self.arrays['time'])
+        if self.size + amount > capacity:
+            while self.size + amount > capacity:
+                capacity *= 2
+            for name, array in self.arrays.items():
+                grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, values in rows.items():
+            self.arrays[name][self.size:self.size + amount] = values
+        self.size += amount
+
+    def discard(self, amount):
+        """Removes the first `amount` rows and shrinks the capacity to twice the remaining rows."""
+        remaining = self.size - amount
+        capacity = max(16, 2 * remaining)
+        for name, array in self.arrays.items():
+            shrunk = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            shrunk[:remaining] = array[amount:self.size]
+            self.arrays[name] = shrunk
+        self.size = remaining
+
+
+class RollupLevel:
+    """
+    Aggregates of one resolution: per bucket of `width` seconds and per channel the minimum,
+    maximum, sum and number of the valid samples. Buckets without samples are not stored.
+
+    Attributes:
+        width (int): The bucket width in seconds.
+        series (_Series): The bucket start times and aggregates.
+    """
+
+    def __init__(self, width, channels):
+        self.width = width
+        self.series = _Series(channels, {'time': np.int64, 'minimum': float, 'maximum': float, 'total': float, 'count': np.int32})
+
+    def add(self, times, values):
+        """
+        Adds samples, which have to be newer than the samples added before.
+
+        Args:
+            times (numpy.ndarray): The sample times in microseconds.
+            values (numpy.ndarray): The values of shape samples x channels, NaN for missing samples.
+        """
+        width = self.width * _SECOND
+        starts = times // width * width
+        first_rows = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        valid = ~np.isnan(values)
+        rows = {
+            'time': starts[first_rows],
+            'minimum': np.fmin.reduceat(values, first_rows, axis=0),
+            'maximum': np.fmax.reduceat(values, first_rows, axis=0),
+            'total': np.add.reduceat(np.where(valid, values, 0.0), first_rows, axis=0),
+            'count': np.add.reduceat(valid.astype(np.int32), first_rows, axis=0)
+        }
+        series = self.series
+        if series.size and series.arrays['time'][series.size - 1] == rows['time'][0]:
+            # The first samples belong to the last bucket, which is still open
+            last = series.size - 1
+            arrays = series.arrays
+            arrays['minimum'][last] = np.fmin(arrays['minimum'][last], rows['minimum'][0])
+            arrays['maximum'][last] = np.fmax(arrays['maximum'][last], rows['maximum'][0])
+            arrays['total'][last] += rows['total'][0]
+            arrays['count'][last] += rows['count'][0]
+            rows = {name: column[1:] for name, column in rows.items()}
+        series.extend(rows)
+
+
+class ClientHistory:
+    """
+    The samples of one client: the raw samples of the last `RAW_WINDOW` seconds and a rollup
+    level per width of `ROLLUP_WIDTHS` for the whole session.
+
+    Attributes:
+        channels (list): The channel names, in column order.
+        raw (_Series): The raw sample times and values.
+        levels (list): The RollupLevel per width, finest first.
+        first (int): The time of the first sample in microseconds, None before the first sample.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.raw = _Series(len(channels), {'time': np.int64, 'value': float})
+        self.levels = [RollupLevel(width, len(channels)) for width in ROLLUP_WIDTHS]
+        self.first = None
+
+    def add(self, times, values):
+        """Adds samples in time order to the raw series and every rollup level."""
+        if not len(times):
+            return
+        if self.first is None:
+            self.first = int(times[0])
+        self.raw.extend({'time': times, 'value': values})
+        for level in self.levels:
+            level.add(times, values)
+        # Raw samples are only dropped once at least half of them expired, so moving the
+        # remaining ones costs O(1) per sample
+        expired = np.searchsorted(self.raw['time'], times[-1] - RAW_WINDOW * _SECOND, side='left')
+        if expired > self.raw.size // 2:
+            self.raw.discard(expired)
+
+    def select(self, start, end, points):
+        """
+        Returns the coarsest resolution that still has at least `points` rows in a time range,
+        so the number of rows is bounded by the points and not by the length of the range.
+
+        Args:
+            start (int): The start of the range in microseconds.
+            end (int): The end of the range in microseconds (inclusive).
+            points (int): The number of points the rows are downsampled to.
+
+        Returns:
+            tuple: The resolution name and the rows as dict of arrays (time, minimum,
+            maximum, total, count).
+        """
+        wanted_width = (end - start) / points
+        level = None
+        for candidate in self.levels:
+            if candidate.width * _SECOND <= wanted_width:
+                level = candidate
+        if level is None and self.raw.size and start < self.raw['time'][0]:
+            # The raw samples of the range are gone, the finest rollup is as close as it gets
+            level = self.levels[0]
+        if level is None:
+            times = self.raw['time']
+            lower, upper = np.searchsorted(times, start, side='left'), np.searchsorted(times, end, side='right')
+            values = self.raw['value'][lower:upper]
+            valid = ~np.isnan(values)
+            rows = {'time': times[lower:upper], 'minimum': values, 'maximum': values,
+                    'total': np.where(valid, values, 0.0), 'count': valid.astype(np.int32)}
+            return 'raw', rows
+        series = level.series
+        times = series['time']
+        # The bucket containing the start belongs to the range as well, an earlier one does not
+        lower = np.searchsorted(times, start, side='right') - 1
+        if lower < 0 or times[lower] + level.width * _SECOND <= start:
+            lower += 1
+        upper = np.searchsorted(times, end, side='right')
+        return f"{level.width}s", {name: series[name][lower:upper] for name in series.arrays}
+
+
+def downsample_minmax(rows, start, end, points):
+    """
+    Reduces rows to at most `points` buckets of equal duration, keeping the minimum, maximum
+    and mean of every bucket, so peaks survive the downsampling.
+
+    Args:
+        rows (dict): Arrays time, minimum, maximum, total and count, ordered by time.
+        start (int): The start of the range in microseconds.
+        end (int): The end of the range in microseconds.
+        points (int): The maximum number of buckets.
+
+    Returns:
+        dict: Arrays time (first row of each bucket), minimum, maximum and mean.
+    """
+    times = rows['time']
+    if not len(times):
+        return {'time': times, 'minimum': rows['minimum'], 'maximum': rows['maximum'], 'mean': rows['minimum']}
+    edges = np.linspace(start, end + 1, points + 1)
+    # Rollup buckets that started before the range count to the first bucket
+    buckets = np.clip(np.searchsorted(edges, times, side='right') - 1, 0, points - 1)
+    first_rows = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    total = np.add.reduceat(rows['total'], first_rows, axis=0)
+    count = np.add.reduceat(rows['count'], first_rows, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    return {
+        'time': times[first_rows],
+        'minimum': np.fmin.reduceat(rows['minimum'], first_rows, axis=0),
+        'maximum': np.fmax.reduceat(rows['maximum'], first_rows, axis=0),
+        'mean': mean
+    }
+
+
+def lttb(times, values, points):
+    """
+    Selects `points` samples with the Largest-Triangle-Three-Buckets algorithm, which keeps
+    the visual shape of a line.
+
+    Args:
+        times (numpy.ndarray): The sample times.
+        values (numpy.ndarray): The sample values without NaN.
+        points (int): The number of samples to select.
+
+    Returns:
+        numpy.ndarray: The indices of the selected samples.
+
+    Raises:
+        ValueError: If less than 3 points are requested, the first and last sample are always kept.
+    """
+    if points < 3:
+        raise ValueError("lttb needs at least 3 points")
+    amount = len(times)
+    if points >= amount:
+        return np.arange(amount)
+    x = times.astype(float)
+    # The first and last sample are always kept, the others are split into points - 2 buckets
+    edges = np.linspace(1, amount - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, amount - 1
+    previous = 0
+    for bucket in range(points - 2):
+        lower, upper = edges[bucket], edges[bucket + 1]
+        following_lower, following_upper = upper, edges[bucket + 2] if bucket + 2 < len(edges) else amount
+        average_x = x[following_lower:following_upper].mean()
+        average_y = values[following_lower:following_upper].mean()
+        areas = np.abs((x[previous] - average_x) * (values[lower:upper] - values[previous])
+                       - (x[previous] - x[lower:upper]) * (average_y - values[previous]))
+        previous = selected[bucket + 1] = lower + int(np.argmax(areas))
+    return selected
+
+
+def _to_list(values):
+    """Converts values to a JSON compatible list, NaN becomes None."""
+    return [None if value != value else round(value, 6) for value in values.tolist()]
+
+
+def _to_timestamps(times):
+    return np.datetime_as_string(times.astype('datetime64[us]'), unit='ms').tolist()
+
+
+class HistoryStore:
+    """
+    Keeps the samples of the active session in multi-resolution rollups to answer queries
+    over any time range with a bounded amount of work. The store follows the session file
+    incrementally and starts over when a new session begins.
+
+    Attributes:
+        topology (Topology): The client topology.
+        locator (SessionLocator): Finds the active session file.
+        path (str): The session file currently followed.
+        clients (dict): The ClientHistory per client address.
+    """
+
+    UPDATE_INTERVAL = 1.0  # Seconds between two reads of the session file
+    MAX_POINTS = 5000
+
+    def __init__(self, topology, locator):
+        self.topology = topology
+        self.locator = locator
+        self.reader = SessionTailReader(window_size=0)
+        self.lock = threading.Lock()
+        self.path = None
+        self.clients = {}
+
+    def reset(self, path):
+        self.path = path
+        self.clients = {role.address: ClientHistory([f"Channel {column}" for column in range(role.channels)]) for role in self.topology.clients}
+
+    def update(self):
+        """Adds the records appended to the session file since the last update."""
+        path = self.locator.latest()
+        with self.lock:
+            generation = self.reader.generation
+            records = self.reader.poll(path)
+            # The reader starts over on another, a replaced or a truncated file, so does the store
+            if path != self.path or self.reader.generation != generation:
+                self.reset(path)
+            per_client = {}
+            for record in records:
+                per_client.setdefault(record.get('pi-address'), []).append(record)
+            for address, client_records in per_client.items():
+                client = self.clients.get(address)
+                if client is None:
+                    continue
+                timestamps, values, _ = records_to_arrays(client_records, client.channels)
+                # Failed polls hold no sample at all and would only add empty buckets
+                timestamps, values = drop_gaps(timestamps, values)
+                times = timestamps.astype(np.int64)
+                # Samples older than the stored ones (clock jumps) would break the time order
+                if client.raw.size:
+                    keep = times >= client.raw.arrays['time'][client.raw.size - 1]
+                    times, values = times[keep], values[keep]
+                client.add(times, values)
+
+    def start(self):
+        """Follows the session file in a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                self.update()
+            except (OSError, ValueError) as e:
+                logging.debug(f"History update failed: {e}")
+            time.sleep(self.UPDATE_INTERVAL)
+
+    def query(self, addresses=None, channels=None, start=None, end=None, points=500, mode='minmax'):
+        """
+        Returns the downsampled samples of some clients and channels in a time range.
+
+        Args:
+            addresses (list, optional): The client addresses, all clients if omitted.
+            channels (list, optional): The channel numbers, all channels if omitted.
+            start (numpy.datetime64, optional): The start of the range, the session start if omitted.
+            end (numpy.datetime64, optional): The end of the range, the newest sample if omitted.
+            points (int): The number of points per channel.
+            mode (str): `minmax` for the minimum, maximum and mean per bucket or `lttb` for
+                the samples selected by Largest-Triangle-Three-Buckets.
+
+        Returns:
+            dict: The session file, time range and the samples per client and channel, clients
+            without samples are left out.
+
+        Raises:
+            ValueError: If an argument is invalid.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode has to be one of {MODES}")
+        if not 1 <= points <= self.MAX_POINTS:
+            raise ValueError(f"points has to be between 1 and {self.MAX_POINTS}")
+        if mode == 'lttb' and points < 3:
+            raise ValueError("points has to be at least 3 for lttb")
+        if channels is not None and any(column < 0 for column in channels):
+            raise ValueError("channels must not be negative")
+        with self.lock:
+            clients = self.clients
+            if addresses is None:
+                addresses = list(clients)
+            unknown = [address for address in addresses if address not in clients]
+            if unknown:
+                raise ValueError(f"Unknown clients: {unknown}")
+            sizes = [clients[address].raw.size for address in addresses]
+            if not any(sizes):
+                return {'session': self.path, 'start': None, 'end': None, 'clients': {}}
+            first = min(clients[address].first for address in addresses if clients[address].raw.size)
+            last = max(clients[address].raw.arrays['time'][clients[address].raw.size - 1] for address in addresses if clients[address].raw.size)
+            start = first if start is None else int(np.datetime64(start, 'us').astype(np.int64))
+            end = last if end is None else int(np.datetime64(end, 'us').astype(np.int64))
+            if end < start:
+                raise ValueError("end has to be after start")
+            result = {}
+            for address in addresses:
+                client = clients[address]
+                if not client.raw.size:
+                    # No samples of the client in the session yet
+                    continue
+                columns = range(len(client.channels)) if channels is None else [column for column in channels if column < len(client.channels)]
+                resolution, rows = client.select(start, end, points)
+                result[address] = self._format(client, resolution, rows, columns, start, end, points, mode)
+        return {
+            'session': self.path,
+            'mode': mode,
+            'start': _to_timestamps(np.array([start]))[0],
+            'end': _to_timestamps(np.array([end]))[0],
+            'clients': result
+        }
+
+    @staticmethod
+    def _format(client, resolution, rows, columns, start, end, points, mode):
+        if mode == 'minmax':
+            buckets = downsample_minmax(rows, start, end, points)
+            return {
+                'resolution': resolution,
+                't': _to_timestamps(buckets['time']),
+                'channels': {
+                    client.channels[column]: {
+                        'min': _to_list(buckets['minimum'][:, column]),
+                        'max': _to_list(buckets['maximum'][:, column]),
+                        'mean': _to_list(buckets['mean'][:, column])
+                    } for column in columns
+                }
+            }
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = rows['total'] / rows['count']
+        channels = {}
+        for column in columns:
+            valid = rows['count'][:, column] > 0
+            times, values = rows['time'][valid], means[valid, column]
+            selected = lttb(times, values, points)
+            channels[client.channels[column]] = {'t': _to_timestamps(times[selected]), 'value': _to_list(values[selected])}
+        return {'resolution': resolution, 'channels': channels}
@@ -0,0 +1,343 @@
+import os
+import json
+import math
+import itertools
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+# Name of the file in the data directory that points to the active session files
+SESSION_POINTER = 'current_session.json'
+
+def sanitize_sensor_data(data):
+    """
+    Converts the channel values of a client response to floats. Values that are not finite
+    numbers are stored as None (JSON null), the representation of a missing sample.
+
+    Args:
+        data (dict): The channel values as received from the client.
+
+    Returns:
+        dict: The channel values, None for invalid samples.
+    """
+    sanitized = {}
+    for channel, value in data.items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = None
+        sanitized[channel] = value if value is not None and math.isfinite(value) else None
+    return sanitized
+
+
+def missing_sensor_data(channels):
+    """
+    Creates the sensor data of a sample that could not be acquired.
+
+    Args:
+        channels (iterable): The channel names of the client.
+
+    Returns:
+        dict: All channels mapped to None.
+    """
+    return {channel: None for channel in channels}
+
+
+def normalize_record(record):
+    """
+    Normalizes a measurement record for processing. Missing samples (JSON null) become NaN
+    and legacy "nodata" records get an empty sensor_data dict, so consumers can always treat
+    `sensor_data` as a dict of floats.
+
+    Args:
+        record (dict): The record as read from a session file or the frame bus.
+
+    Returns:
+        dict: The normalized record.
+    """
+    sensor_data = record.get('sensor_data')
+    if not isinstance(sensor_data, dict):
+        sensor_data = {}
+    else:
+        sensor_data = {channel: np.nan if value is None else value for channel, value in sensor_data.items()}
+    normalized = dict(record)
+    normalized['sensor_data'] = sensor_data
+    return normalized
+
+
+def records_to_arrays(records, channels):
+    """
+    Converts the records of one client to arrays.
+
+    Args:
+        records (list): The measurement records of one client.
+        channels (list): The channel names, in column order.
+
+    Returns:
+        tuple: Timestamps (numpy.datetime64 array), values (float array of shape
+        records x channels, NaN for missing samples) and the validity mask.
+    """
+    timestamps = np.array([record['timestamp'] for record in records], dtype='datetime64[us]')
+    values = np.full((len(records), len(channels)), np.nan)
+    for row, record in enumerate(records):
+        sensor_data = record.get('sensor_data')
+        if not isinstance(sensor_data, dict):
+            continue
+        for column, channel in enumerate(channels):
+            value = sensor_data.get(channel)
+            if value is not None:
+                values[row, column] = value
+    return timestamps, values, ~np.isnan(values)
+
+
+def drop_gaps(timestamps, values):
+    """
+    Removes the rows that contain no valid sample.
+
+    Args:
+        timestamps (numpy.ndarray): The timestamps of the rows.
+        values (numpy.ndarray): The values, NaN for missing samples.
+
+    Returns:
+        tuple: The timestamps and values of the rows with at least one valid sample.
+    """
+    keep = ~np.isnan(values).all(axis=1)
+    return timestamps[keep], values[keep]
+
+
+class GapStatistics:
+    """
+    Keeps per-client statistics about missing samples.
+
+    Attributes:
+        clients (dict): Per client the number of samples, missing samples, the length of
+            the current gap and of the longest gap so far.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def update(self, pi, valid):
+        """
+        Registers one sample of a client.
+
+        Args:
+            pi (str): The Raspberry Pi address.
+            valid (bool): Whether the sample was acquired successfully.
+
+        Returns:
+            bool: True if a gap started or ended with this sample.
+        """
+        stats = self.clients.setdefault(pi, {'samples': 0, 'missing': 0, 'current_gap': 0, 'longest_gap': 0})
+        stats['samples'] += 1
+        in_gap = stats['current_gap'] > 0
+        if valid:
+            stats['current_gap'] = 0
+            return in_gap
+        stats['missing'] += 1
+        stats['current_gap'] += 1
+        stats['longest_gap'] = max(stats['longest_gap'], stats['current_gap'])
+        return not in_gap
+
+    def as_dict(self):
+        """
+        Returns the statistics including the missing ratio of every client.
+
+        Returns:
+            dict: The statistics per client.
+        """
+        return {pi: dict(stats, missing_ratio=stats['missing'] / stats['samples']) for pi, stats in self.clients.items()}
+
+
+class SessionTailReader:
+    """
+    Incrementally reads a JSON-lines session file. The reader remembers its byte offset and
+    only parses lines appended since the last poll. It keeps the first records of the session
+    and a bounded window of the newest records in memory. If the file is replaced or
+    truncated, or another file is polled, the reader starts over.
+
+    Attributes:
+        path (str): The file currently followed.
+        offset (int): Byte offset up to which the file has been parsed.
+        head (list): The oldest records of the session, at most `head_size`.
+        window (collections.deque): The newest records of the session.
+        generation (int): Increases whenever the reader starts over, so consumers that keep
+            their own state know when to drop it.
+    """
+
+    def __init__(self, window_size, head_size=0):
+        self.window_size = window_size
+        self.head_size = head_size
+        self.path = None
+        self.generation = 0
+        self.reset()
+
+    def reset(self, path=None):
+        """
+        Forgets all records and starts following a file from its beginning.
+
+        Args:
+            path (str, optional): The file to follow.
+        """
+        self.path = path
+        self.generation += 1
+        self.inode = None
+        self.offset = 0
+        self.partial = b''
+        self.head = []
+        self.window = deque(maxlen=self.window_size)
+
+    def poll(self, path):
+        """
+        Parses the lines appended to the file since the last poll.
+
+        Args:
+            path (str): The session file to follow.
+
+        Returns:
+            list: The new, normalized records.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.reset()
+            return []
+        if path != self.path or stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset(path)
+            self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return []
+
+        with open(path, 'rb') as file:
+            file.seek(self.offset)
+            chunk = file.read(stat.st_size - self.offset)
+        self.offset += len(chunk)
+
+        lines = (self.partial + chunk).split(b'\n')
+        # The last element is an incomplete line that is still being written, or empty
+        self.partial = lines.pop()
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = normalize_record(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            records.append(record)
+            if len(self.head) < self.head_size:
+                self.head.append(record)
+            self.window.append(record)
+        return records
+
+    def oldest(self, amount):
+        """
+        Returns the oldest records of the session.
+
+        Args:
+            amount (int): The number of records.
+
+        Returns:
+            list: Up to `amount` records.
+        """
+        return self.head[:amount]
+
+    def newest(self, amount):
+        """
+        Returns the newest records of the session.
+
+        Args:
+            amount (int): The number of records.
+
+        Returns:
+            list: Up to `amount` records, oldest first.
+        """
+        if amount >= len(self.window):
+            return list(self.window)
+        return list(itertools.islice(self.window, len(self.window) - amount, None))
+
+
+def write_session_pointer(directory, filename, raw_filename):
+    """
+    Atomically writes the pointer to the active session files, so readers find the current
+    session without scanning the data directory.
+
+    Args:
+        directory (str): The measurement data directory.
+        filename (str): The file of the filtered session data.
+        raw_filename (str): The file of the raw session data.
+    """
+    pointer = {
+        'measurementData': os.path.basename(filename),
+        'rawData': os.path.basename(raw_filename),
+        'started': datetime.now().isoformat()
+    }
+    path = os.path.join(directory, SESSION_POINTER)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(pointer, file)
+    os.replace(temporary_path, path)
+
+
+class SessionLocator:
+    """
+    Finds the active session file of a data directory with a few stat calls. It follows the
+    session pointer written by measurementServer and only re-reads it when its mtime changes.
+    Without a pointer the directory is only rescanned when its mtime changes.
+
+    Attributes:
+        data_dir (str): The measurement data directory.
+        kind (str): The session file kind, `measurementData` or `rawData`.
+    """
+
+    def __init__(self, data_dir, kind='measurementData'):
+        self.data_dir = data_dir
+        self.kind = kind
+        self.pointer_path = os.path.join(data_dir, SESSION_POINTER)
+        self.pointer_mtime = None
+        self.directory_mtime = None
+        self.cached_file = None
+
+    def _from_pointer(self):
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except FileNotFoundError:
+            self.pointer_mtime = None
+            return None
+        if mtime != self.pointer_mtime:
+            try:
+                with open(self.pointer_path) as file:
+                    name = json.load(file)[self.kind]
+            except (OSError, ValueError, KeyError):
+                return None
+            self.pointer_mtime = mtime
+            self.cached_file = os.path.join(self.data_dir, name)
+        return self.cached_file
+
+    def _from_directory(self):
+        mtime = os.stat(self.data_dir).st_mtime_ns
+        if mtime != self.directory_mtime or self.cached_file is None:
+            suffix = f"_{self.kind}.json"
+            files = [name for name in os.listdir(self.data_dir) if name.endswith(suffix)]
+            # Session files start with their creation time (YYYYmmddHHMMSS), so the name orders them
+            self.cached_file = os.path.join(self.data_dir, max(files)) if files else None
+            self.directory_mtime = mtime
+        return self.cached_file
+
+    def latest(self):
+        """
+        Returns the path of the active session file.
+
+        Returns:
+            str: The path of the session file.
+
+        Raises:
+            FileNotFoundError: If the directory contains no session file.
+        """
+        latest_file = self._from_pointer()
+        if latest_file is None or not os.path.exists(latest_file):
+            self.pointer_mtime = None
+            latest_file = self._from_directory()
+        if latest_file is None:
+            raise FileNotFoundError(f"No {self.kind} files found in: {self.data_dir}")
+        return latest_file
@@ -1,12 +1,18 @@
 import os
 import time
 import json
+import argparse
+import threading
 import requests
 import logging
 from datetime import datetime
 import configparser
 from collections import defaultdict, deque
 import numpy as np
+from frameBus import FramePublisher
+from measurementData import GapStatistics, sanitize_sensor_data, missing_sensor_data, write_session_pointer
+from pipeline import BoundedQueue, Pipeline
+from topology import load_topology, clean_value
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.ini')
 DATA_DIR = 'measurement_data'
@@ -41,18 +47,6 @@ def read_config(config_path):
     config.read(config_path)
     return config
 
-def clean_value(value):
-    """
-    Cleans a configuration value by removing comments and extra whitespace.
-
-    Args:
-        value (str): The value to be cleaned.
-
-    Returns:
-        str: The cleaned value.
-    """
-    return value.split(';')[0].split('#')[0].strip()
-
 def initialize_directories(directory):
     """
     Creates the specified directory if it does not exist.
@@ -76,46 +70,344 @@ def generate_filename(directory, suffix):
     current_datetime = datetime.now().strftime("%Y%m%d%H%M%S")
     return os.path.join(directory, f"{current_datetime}_{suffix}.json")
 
-def request_data(pis, port, filename, raw_filename):
+class AdaptiveScheduler:
+    """
+    Chooses the polling interval from the current activity on the board.
+
+    Every channel keeps a slowly adapting baseline. A sample that deviates from its baseline
+    by more than `deviation`, or an activity hint from a consumer (e.g. a running detection
+    in resistectorUI), switches to `min_interval` immediately. After `idle_timeout` seconds
+    without activity the interval backs off step by step up to `max_interval`.
+
+    Attributes:
+        min_interval (float): Polling interval in seconds while the board is active.
+        max_interval (float): Polling interval in seconds while the board is idle.
+        idle_timeout (float): Seconds without activity before the polling slows down.
+        deviation (float): Absolute deviation from the baseline that counts as activity.
+        interval (float): The current polling interval.
     """
-    Requests measurement data from the specified Raspberry Pi devices and saves it to a file.
 
-    Args:
-        pis (list): List of Raspberry Pi addresses.
-        port (str): The port number to use for the requests.
-        filename (str): The file where the data will be saved.
+    BACKOFF_FACTOR = 1.25
+
+    def __init__(self, min_interval, max_interval, idle_timeout, deviation, alpha=0.05):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Invalid sampling bounds: 0 < min_interval <= max_interval required")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_timeout = idle_timeout
+        self.deviation = deviation
+        self.alpha = alpha
+        self.baselines = defaultdict(dict)
+        self.last_activity = time.monotonic()
+        self.interval = min_interval
+
+    def observe(self, pi, data):
+        """
+        Updates the channel baselines of a client and registers deviating channels as activity.
+
+        Args:
+            pi (str): The Raspberry Pi address.
+            data (dict): The filtered measurement data.
+        """
+        baselines = self.baselines[pi]
+        for channel, value in data.items():
+            if value is None:
+                continue
+            baseline = baselines.get(channel)
+            if baseline is None:
+                baselines[channel] = value
+                continue
+            if abs(value - baseline) > self.deviation:
+                self.last_activity = time.monotonic()
+            baselines[channel] = baseline + self.alpha * (value - baseline)
+
+    def notify_activity(self):
+        """
+        Registers activity reported from outside, e.g. a detection in progress.
+        """
+        self.last_activity = time.monotonic()
+
+    def on_message(self, message):
+        """
+        Handles a message sent by a frame bus subscriber.
+
+        Args:
+            message (dict): The received message.
+        """
+        if message.get('activity'):
+            self.notify_activity()
+
+    def next_interval(self):
+        """
+        Calculates the interval until the next poll.
+
+        Returns:
+            float: The polling interval in seconds.
+        """
+        if time.monotonic() - self.last_activity < self.idle_timeout:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.BACKOFF_FACTOR, self.max_interval)
+        return self.interval
+
+class ServerStatus:
+    """
+    Collects the status values reported to frame bus subscribers, e.g. the sampling
+    interval, gap statistics and pipeline statistics.
+
+    Attributes:
+        publisher (FramePublisher): The frame bus the status is published on.
+        values (dict): The current status values.
     """
-    for pi in pis:
-        try:
-            response = requests.get(f'http://{pi}:{port}/measure')
-            response.raise_for_status()
-            data = response.json()
-            save_data(data, pi, raw_filename)
 
-            filtered_data = filter_data(pi, data)
-            save_data(filtered_data, pi, filename)
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Could not connect to {pi}: {e}")
-            save_data("nodata", pi, filename)
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.values = {}
+        self.lock = threading.Lock()
 
-def save_data(data, pi, filename):
+    def update(self, **values):
+        """
+        Updates status values and publishes the complete status.
+
+        Args:
+            **values: The changed status values.
+        """
+        with self.lock:
+            self.values.update(values)
+            status = dict(self.values)
+        self.publisher.publish_status(status)
+
+def fetch_sample(pi, port, timeout):
     """
-    Saves the measurement data to a file with a timestamp.
+    Ingest: requests one measurement from a Raspberry Pi device.
 
     Args:
-        data (dict): The data to save.
         pi (str): The Raspberry Pi address.
-        filename (str): The file where the data will be saved.
+        port (str): The port number to use for the request.
+        timeout (float): Seconds until the request counts as failed.
+
+    Returns:
+        dict: The sample with the client address, the acquisition timestamp and the
+        response payload (None if the request failed).
     """
     timestamp = datetime.now().isoformat()
-    formatted_data = {
+    try:
+        response = requests.get(f'http://{pi}:{port}/measure', timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"Could not connect to {pi}: {e}")
+        payload = None
+    return {'pi-address': pi, 'timestamp': timestamp, 'payload': payload}
+
+def decode_sample(sample, status):
+    """
+    Decode stage: validates the payload and turns failed requests into missing samples.
+
+    Args:
+        sample (dict): The sample from the ingest stage.
+        status (ServerStatus): Receives the gap statistics whenever a gap starts or ends.
+
+    Returns:
+        dict: The sample with the raw channel values, None for missing samples.
+    """
+    pi = sample['pi-address']
+    if isinstance(sample['payload'], dict):
+        sample['raw'] = sanitize_sensor_data(sample['payload'])
+        known_channels[pi] = list(sample['raw'])
+    else:
+        sample['raw'] = missing_sensor_data(known_channels.get(pi, []))
+    sample['valid'] = any(value is not None for value in sample['raw'].values())
+    if gap_statistics.update(pi, sample['valid']):
+        status.update(gaps=gap_statistics.as_dict())
+    return sample
+
+def filter_sample(sample, topology):
+    """
+    Filter stage: applies the EMA and threshold filters.
+
+    Args:
+        sample (dict): The decoded sample.
+        topology (Topology): The client topology with the threshold filter ranges.
+
+    Returns:
+        dict: The sample with the filtered channel values.
+    """
+    role = topology.role(sample['pi-address'])
+    filter_range = role.filter_range if role is not None else None
+    sample['filtered'] = filter_data(sample['pi-address'], sample['raw'], filter_range=filter_range)
+    return sample
+
+def detect_sample(sample, scheduler):
+    """
+    Detect stage: lets the adaptive scheduler look for activity on the board.
+
+    Args:
+        sample (dict): The filtered sample.
+        scheduler (AdaptiveScheduler): The scheduler observing the filtered data.
+
+    Returns:
+        dict: The unchanged sample.
+    """
+    if sample['valid']:
+        scheduler.observe(sample['pi-address'], sample['filtered'])
+    return sample
+
+def persist_sample(sample, filename, raw_filename):
+    """
+    Persist stage: appends the raw and the filtered record to the session files.
+
+    Args:
+        sample (dict): The filtered sample.
+        filename (str): The file where the filtered data will be saved.
+        raw_filename (str): The file where the unfiltered data will be saved.
+    """
+    save_data(sample['raw'], sample['pi-address'], raw_filename, sample['timestamp'])
+    save_data(sample['filtered'], sample['pi-address'], filename, sample['timestamp'])
+
+def publish_sample(sample, publisher):
+    """
+    Publish stage: publishes the filtered record on the frame bus.
+
+    Args:
+        sample (dict): The filtered sample.
+        publisher (FramePublisher): The frame bus.
+    """
+    publisher.publish(make_record(sample['filtered'], sample['pi-address'], sample['timestamp']))
+
+def read_queue_config(config, stage, default_size, default_policy):
+    """
+    Reads the size and overflow policy of a stage queue from the `Pipeline` section.
+
+    Args:
+        config (configparser.ConfigParser): The configuration object.
+        stage (str): The name of the stage.
+        default_size (int): The queue size if not configured.
+        default_policy (str): The overflow policy if not configured.
+
+    Returns:
+        tuple: The queue size and the overflow policy.
+    """
+    section = config['Pipeline'] if 'Pipeline' in config else {}
+    value = clean_value(section.get(f'{stage}_queue', f'{default_size}, {default_policy}'))
+    size, policy = [part.strip() for part in value.split(',')]
+    return int(size), policy
+
+def build_pipeline(config, topology, publisher, scheduler, status, filename, raw_filename):
+    """
+    Connects the decode, filter, detect, persist and publish stages with bounded queues.
+    The detect stage hands its results to separate forwarder threads for persist and
+    publish, so a slow disk does not delay the subscribers (and slow subscribers do not
+    delay the disk) until the backlog exceeds twice the size of its queue. The publish
+    queue blocks by default, so subscribers asking for the lossless `block` bus policy,
+    like the detection of the Resistector UI, see every frame.
+
+    Args:
+        config (configparser.ConfigParser): The configuration object.
+        topology (Topology): The client topology.
+        publisher (FramePublisher): The frame bus.
+        scheduler (AdaptiveScheduler): The adaptive scheduler.
+        status (ServerStatus): The status reported to subscribers.
+        filename (str): The file where the filtered data will be saved.
+        raw_filename (str): The file where the unfiltered data will be saved.
+
+    Returns:
+        tuple: The pipeline and the queue the ingest source feeds.
+    """
+    def queue(stage, default_size, default_policy):
+        size, policy = read_queue_config(config, stage, default_size, default_policy)
+        return BoundedQueue(stage, size, policy, key=lambda sample: sample['pi-address'])
+
+    decode_queue = queue('decode', 64, 'block')
+    filter_queue = queue('filter', 64, 'block')
+    detect_queue = queue('detect', 64, 'block')
+    persist_queue = queue('persist', 1024, 'block')
+    publish_queue = queue('publish', 64, 'block')
+
+    pipeline = Pipeline()
+    pipeline.add_stage('decode', lambda sample: decode_sample(sample, status), decode_queue, [filter_queue])
+    pipeline.add_stage('filter', lambda sample: filter_sample(sample, topology), filter_queue, [detect_queue])
+    pipeline.add_stage('detect', lambda sample: detect_sample(sample, scheduler), detect_queue, [persist_queue, publish_queue])
+    pipeline.add_stage('persist', lambda sample: persist_sample(sample, filename, raw_filename), persist_queue)
+    pipeline.add_stage('publish', lambda sample: publish_sample(sample, publisher), publish_queue)
+    return pipeline, decode_queue
+
+def report_pipeline_stats(pipeline, status, interval):
+    """
+    Periodically logs the queue depths and stage latencies and publishes them as status.
+
+    Args:
+        pipeline (Pipeline): The running pipeline.
+        status (ServerStatus): The status reported to subscribers.
+        interval (float): Seconds between two reports.
+    """
+    while True:
+        time.sleep(interval)
+        stats = pipeline.stats()
+        logging.info(f"Pipeline stats: {json.dumps(stats)}")
+        status.update(pipeline=stats)
+
+def poll_clients(pis, port, timeout, entry_queue, scheduler, status):
+    """
+    Ingest source: polls all clients at the interval chosen by the adaptive scheduler.
+
+    Args:
+        pis (list): List of Raspberry Pi addresses.
+        port (str): The port number to use for the requests.
+        timeout (float): Seconds until a request counts as failed.
+        entry_queue (BoundedQueue): The queue of the decode stage.
+        scheduler (AdaptiveScheduler): The adaptive scheduler.
+        status (ServerStatus): The status reported to subscribers.
+    """
+    while True:
+        started = time.monotonic()
+        for pi in pis:
+            entry_queue.put(fetch_sample(pi, port, timeout))
+        previous_interval = scheduler.interval
+        interval = scheduler.next_interval()
+        if interval != previous_interval:
+            logging.info(f"Sampling interval changed to {interval:.2f}s")
+            status.update(sample_interval=interval)
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+def make_record(data, pi, timestamp):
+    """
+    Creates a measurement record as it is stored in the session files and published on the bus.
+
+    Args:
+        data (dict): The channel values, None for missing samples.
+        pi (str): The Raspberry Pi address.
+        timestamp (str): The ISO formatted acquisition time.
+
+    Returns:
+        dict: The measurement record.
+    """
+    return {
         'pi-address': pi,
         'sensor_data': data,
         'timestamp': timestamp
     }
+
+def save_data(data, pi, filename, timestamp=None):
+    """
+    Saves the measurement data to a file with a timestamp.
+
+    Args:
+        data (dict): The data to save, None for missing samples.
+        pi (str): The Raspberry Pi address.
+        filename (str): The file where the data will be saved.
+        timestamp (str, optional): The ISO formatted acquisition time, defaults to now.
+
+    Returns:
+        dict: The record as it was written to the file.
+    """
+    if timestamp is None:
+        timestamp = datetime.now().isoformat()
+    formatted_data = make_record(data, pi, timestamp)
     with open(filename, 'a') as file:
         json.dump(formatted_data, file)
         file.write('\n')
+    return formatted_data
 
 def validate_config(config):
     """
@@ -178,14 +470,23 @@ def apply_threshold_filter(value, previous_value, total_min, total_max, min_thre
 ema_recent_data = defaultdict(lambda: defaultdict(deque))
 thres_recent_data = defaultdict(lambda: defaultdict(deque))
 
-def filter_data(pi, data, alpha=0.1):
+# Maximum change per sample allowed by the threshold filter
+THRESHOLD_STEP = 0.3
+
+# Channel names of the last valid response and missing sample statistics per client
+known_channels = {}
+gap_statistics = GapStatistics()
+
+def filter_data(pi, data, alpha=0.1, filter_range=None):
     """
     Filters the measurement data using EMA and threshold filters.
 
     Args:
         pi (str): The Raspberry Pi address.
-        data (dict): The raw measurement data.
+        data (dict): The raw measurement data, None for missing samples.
         alpha (float): The smoothing factor for the EMA filter.
+        filter_range (tuple, optional): The valid (min, max) range of the threshold filter
+            from the client topology, None to only apply the EMA filter.
 
     Returns:
         dict: The filtered data.
@@ -194,6 +495,12 @@ def filter_data(pi, data, alpha=0.1):
     thres_filtered_data = {}
     
     for channel, value in data.items():
+        # Missing samples stay missing and do not disturb the filter history
+        if value is None:
+            ema_filtered_data[channel] = None
+            thres_filtered_data[channel] = None
+            continue
+
         # Add the new value to the recent data points and apply the EMA filter
         ema_recent_data[pi][channel].append(value)
         ema_filtered_value = apply_ema_filter(list(ema_recent_data[pi][channel]), alpha)
@@ -203,20 +510,10 @@ def filter_data(pi, data, alpha=0.1):
         if len(ema_recent_data[pi][channel]) > 10:
             ema_recent_data[pi][channel].popleft()
 
-        # Apply the threshold filter if the Pi address is in the special addresses
-        if pi in ["10.42.0.1"]:
+        # Apply the threshold filter if the topology defines a valid range for the client
+        if filter_range is not None:
             previous_value = thres_recent_data[pi][channel][-1] if thres_recent_data[pi][channel] else ema_filtered_value
-            thres_filtered_value = apply_threshold_filter(ema_filtered_value, previous_value, 8, 17, 0.3, 0.3)
-            thres_filtered_data[channel] = thres_filtered_value
-
-        if pi in ["10.42.0.2"]:
-            previous_value = thres_recent_data[pi][channel][-1] if thres_recent_data[pi][channel] else ema_filtered_value
-            thres_filtered_value = apply_threshold_filter(ema_filtered_value, previous_value, 10, 22, 0.3, 0.3)
-            thres_filtered_data[channel] = thres_filtered_value
-
-        if pi in ["10.42.0.3"]:
-            previous_value = thres_recent_data[pi][channel][-1] if thres_recent_data[pi][channel] else ema_filtered_value
-            thres_filtered_value = apply_threshold_filter(ema_filtered_value, previous_value, 10, 22, 0.3, 0.3)
+            thres_filtered_value = apply_threshold_filter(ema_filtered_value, previous_value, filter_range[0], filter_range[1], THRESHOLD_STEP, THRESHOLD_STEP)
             thres_filtered_data[channel] = thres_filtered_value
 
             # Add the filtered value to the deque
@@ -225,32 +522,185 @@ def filter_data(pi, data, alpha=0.1):
                 thres_recent_data[pi][channel].popleft()
    
     # Return threshold-filtered data if applied, otherwise return EMA-filtered data
-    if thres_filtered_data:
+    if filter_range is not None:
         return thres_filtered_data
     else:
         return ema_filtered_data
 
-def main():
+def create_scheduler(config):
+    """
+    Creates the adaptive scheduler from the `Sampling` section of the configuration.
+
+    Args:
+        config (configparser.ConfigParser): The configuration object.
+
+    Returns:
+        AdaptiveScheduler: The configured scheduler.
+    """
+    sampling = config['Sampling'] if 'Sampling' in config else {}
+    return AdaptiveScheduler(
+        min_interval=float(clean_value(sampling.get('min_interval', '0.4'))),
+        max_interval=float(clean_value(sampling.get('max_interval', '2.0'))),
+        idle_timeout=float(clean_value(sampling.get('idle_timeout', '30'))),
+        deviation=float(clean_value(sampling.get('activity_deviation', '0.2')))
+    )
+
+def read_replay_samples(raw_filename):
+    """
+    Reads a recorded raw session line by line and converts the records back to ingest samples.
+
+    Args:
+        raw_filename (str): The `_rawData.json` file of the recorded session.
+
+    Yields:
+        tuple: The original acquisition time (datetime) and the sample.
+    """
+    with open(raw_filename) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logging.error(f"Skipping invalid line in {raw_filename}")
+                continue
+            payload = record['sensor_data'] if isinstance(record.get('sensor_data'), dict) else None
+            sample = {'pi-address': record['pi-address'], 'timestamp': record['timestamp'], 'payload': payload}
+            yield datetime.fromisoformat(record['timestamp']), sample
+
+def replay_session(raw_filename, speed, entry_queue, retime=False):
+    """
+    Ingest source: streams a recorded raw session into the pipeline. The original
+    inter-sample timing is kept, scaled by `speed`.
+
+    Args:
+        raw_filename (str): The `_rawData.json` file of the recorded session.
+        speed (float): Replay speed factor, None to replay as fast as possible.
+        entry_queue (BoundedQueue): The queue of the decode stage.
+        retime (bool): If True the samples get timestamps relative to the replay start
+            instead of their original ones.
+
+    Returns:
+        int: The number of replayed samples.
+    """
+    count = 0
+    first_time = None
+    started = time.monotonic()
+    replay_start = datetime.now()
+    for recorded_at, sample in read_replay_samples(raw_filename):
+        if first_time is None:
+            first_time = recorded_at
+        offset = (recorded_at - first_time).total_seconds()
+        if speed is not None:
+            delay = started + offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if retime:
+            sample['timestamp'] = (replay_start + (recorded_at - first_time)).isoformat()
+        if not entry_queue.put(sample):
+            break
+        count += 1
+    return count
+
+def parse_speed(value):
+    """
+    Parses the replay speed argument.
+
+    Args:
+        value (str): A positive factor like `1` or `10`, or `max`.
+
+    Returns:
+        float: The speed factor, None for as fast as possible.
+    """
+    if value == 'max':
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("Replay speed has to be positive or 'max'")
+    return speed
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments, defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Resistector measurement server")
+    parser.add_argument('--replay', metavar='RAW_FILE', help="replay a recorded _rawData.json session instead of polling the clients")
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help="replay speed factor, e.g. 1 or 10, or 'max' (default: 1)")
+    parser.add_argument('--retime', action='store_true', help="give replayed samples timestamps relative to now")
+    return parser.parse_args(argv)
+
+def run_replay(args, entry_queue, pipeline):
+    """
+    Replays a raw session, waits until the pipeline is drained and reports the throughput.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+        entry_queue (BoundedQueue): The queue of the decode stage.
+        pipeline (Pipeline): The running pipeline.
+    """
+    speed = 'max' if args.speed is None else f"{args.speed:g}x"
+    logging.info(f"Replaying {args.replay} at {speed}")
+    started = time.monotonic()
+    count = replay_session(args.replay, args.speed, entry_queue, args.retime)
+    entry_queue.close()
+    pipeline.join()
+    elapsed = time.monotonic() - started
+    throughput = count / elapsed if elapsed > 0 else float('inf')
+    logging.info(f"Replayed {count} samples in {elapsed:.2f}s ({throughput:.1f} samples/s) at {speed}")
+    logging.info(f"Pipeline stats: {json.dumps(pipeline.stats())}")
+
+def main(argv=None):
     """
     Main function of the application. Reads the configuration, initializes directories,
-    and periodically requests data from the Raspberry Pi devices.
+    starts the processing pipeline and periodically requests data from the Raspberry Pi devices,
+    or replays a recorded raw session through the same pipeline.
     """
+    args = parse_arguments(argv)
     config = read_config(CONFIG_PATH)
     validate_config(config)
     
-    pis = list(map(clean_value, config['Network']['client_ips'].split(',')))
+    topology = load_topology(config)
+    pis = topology.addresses
     port = clean_value(config['Network']['client_port'])
+    timeout = float(clean_value(config['Network'].get('client_timeout', '2')))
+
+    bus_port = int(clean_value(config['Network'].get('bus_port', '5060')))
+    bus_policy = clean_value(config['Network'].get('bus_slow_subscriber', 'conflate'))
+    scheduler = create_scheduler(config)
 
     initialize_directories(DATA_DIR)
     filename = generate_filename(DATA_DIR, "measurementData")
     raw_filename = generate_filename(DATA_DIR, "rawData")
+    write_session_pointer(DATA_DIR, filename, raw_filename)
+
+    publisher = FramePublisher(bus_port, policy=bus_policy, on_message=scheduler.on_message)
+    publisher.start()
+    status = ServerStatus(publisher)
+    status.update(sample_interval=scheduler.interval, gaps=gap_statistics.as_dict())
+
+    pipeline, entry_queue = build_pipeline(config, topology, publisher, scheduler, status, filename, raw_filename)
+    pipeline.start()
+    stats_interval = float(clean_value(config['Pipeline'].get('stats_interval', '30'))) if 'Pipeline' in config else 30.0
+    threading.Thread(target=report_pipeline_stats, args=(pipeline, status, stats_interval), daemon=True).start()
 
     try:
-        while True:
-            request_data(pis, port, filename, raw_filename)
-            time.sleep(0.8)
+        if args.replay:
+            run_replay(args, entry_queue, pipeline)
+        else:
+            poll_clients(pis, port, timeout, entry_queue, scheduler, status)
     except KeyboardInterrupt:
         logging.info("Measurement server stopped by user")
+    finally:
+        entry_queue.close()
+        pipeline.join(timeout=5)
+        # Subscribers get the frames still queued for them, e.g. the tail of a replay
+        if not publisher.drain(timeout=5):
+            logging.warning("Frame bus closed before all subscribers received their frames")
+        publisher.close()
 
 if __name__ == '__main__':
     try:
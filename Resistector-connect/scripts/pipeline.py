@@ -0,0 +1,274 @@
+import time
+import logging
+import threading
+from collections import deque
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'conflate')
+
+
+class BoundedQueue:
+    """
+    A bounded queue between two pipeline stages with a configurable overflow policy.
+
+    - `block`: the producer waits until the consumer made room (backpressure).
+    - `drop_oldest`: the oldest queued item is discarded to make room.
+    - `conflate`: a queued item with the same key is replaced by the new one, if there is
+      none the oldest item is discarded.
+
+    Attributes:
+        name (str): The name of the queue, used in statistics.
+        maxsize (int): The maximum number of queued items.
+        policy (str): The overflow policy.
+        key (callable): Returns the conflation key of an item.
+        dropped (int): Number of discarded or replaced items.
+        high_watermark (int): The maximum depth seen so far.
+    """
+
+    def __init__(self, name, maxsize, policy='block', key=None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy for queue {name}: {policy}")
+        if maxsize < 1:
+            raise ValueError(f"Queue {name} needs a size of at least 1")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key or (lambda item: item)
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.high_watermark = 0
+
+    def put(self, item):
+        """
+        Adds an item according to the overflow policy.
+
+        Args:
+            item: The item to queue.
+
+        Returns:
+            bool: False if the queue was closed and the item was not queued.
+        """
+        entry = (time.monotonic(), item)
+        with self.condition:
+            if self.policy == 'conflate':
+                key = self.key(item)
+                for index, (_, queued) in enumerate(self.items):
+                    if self.key(queued) == key:
+                        del self.items[index]
+                        self.dropped += 1
+                        break
+            if self.policy == 'block':
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            if self.closed:
+                return False
+            self.items.append(entry)
+            self.high_watermark = max(self.high_watermark, len(self.items))
+            self.condition.notify_all()
+        return True
+
+    def get(self):
+        """
+        Removes the oldest item, waiting until one is available.
+
+        Returns:
+            tuple: The time the item was queued and the item, or None once the queue is
+            closed and drained.
+        """
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            if not self.items:
+                return None
+            entry = self.items.popleft()
+            self.condition.notify_all()
+            return entry
+
+    def close(self):
+        """
+        Closes the queue. Queued items can still be consumed.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def depth(self):
+        """
+        Returns the current number of queued items.
+        """
+        with self.condition:
+            return len(self.items)
+
+
+class Stage:
+    """
+    A pipeline stage. Consumes items from its inbox in a dedicated thread, runs the
+    handler on them and forwards every result to all outboxes.
+
+    With several outboxes every outbox gets its own forwarder thread fed by a private
+    queue of the same size and policy, so a full outbox only holds up the stage once
+    that backlog is exhausted, not on the first put.
+
+    Attributes:
+        name (str): The name of the stage.
+        handler (callable): Processes one item and returns the result, None to consume it.
+        inbox (BoundedQueue): The queue the stage consumes.
+        outboxes (list): The queues of the following stages.
+        fanouts (list): The private queues of the forwarder threads, empty with a single outbox.
+    """
+
+    def __init__(self, name, handler, inbox, outboxes=()):
+        self.name = name
+        self.handler = handler
+        self.inbox = inbox
+        self.outboxes = list(outboxes)
+        self.fanouts = []
+        if len(self.outboxes) > 1:
+            self.fanouts = [BoundedQueue(f"{name}-{outbox.name}", outbox.maxsize, outbox.policy, key=outbox.key)
+                            for outbox in self.outboxes]
+        self.processed = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.service_total = 0.0
+        self.service_max = 0.0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the stage thread and the forwarder threads.
+        """
+        for fanout, outbox in zip(self.fanouts, self.outboxes):
+            threading.Thread(target=self.forward, args=(fanout, outbox),
+                             name=f"stage-{fanout.name}", daemon=True).start()
+        self.thread = threading.Thread(target=self.run, name=f"stage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """
+        Stage loop. Ends when the inbox is closed and drained, then closes the outboxes.
+        """
+        while True:
+            entry = self.inbox.get()
+            if entry is None:
+                break
+            queued_at, item = entry
+            started = time.monotonic()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                logging.error(f"Pipeline stage {self.name} failed: {e}", exc_info=True)
+                result = None
+                with self.lock:
+                    self.errors += 1
+            finished = time.monotonic()
+            with self.lock:
+                self.processed += 1
+                self.wait_total += started - queued_at
+                self.service_total += finished - started
+                self.service_max = max(self.service_max, finished - started)
+            if result is not None:
+                for outbox in self.fanouts or self.outboxes:
+                    outbox.put(result)
+        for outbox in self.fanouts or self.outboxes:
+            outbox.close()
+
+    def forward(self, fanout, outbox):
+        """
+        Forwarder loop. Moves results from a private queue to its outbox and closes the
+        outbox once the private queue is closed and drained.
+
+        Args:
+            fanout (BoundedQueue): The private queue filled by the stage thread.
+            outbox (BoundedQueue): The queue of the following stage.
+        """
+        while True:
+            entry = fanout.get()
+            if entry is None:
+                break
+            outbox.put(entry[1])
+        outbox.close()
+
+    def stats(self):
+        """
+        Returns the queue and latency statistics of the stage.
+
+        Returns:
+            dict: Queue depth and size, dropped items, processed items, errors and the mean
+            queue wait and mean/max service time in milliseconds.
+        """
+        with self.lock:
+            processed = self.processed
+            return {
+                'queue_depth': self.inbox.depth(),
+                'queue_size': self.inbox.maxsize,
+                'queue_high_watermark': self.inbox.high_watermark,
+                'policy': self.inbox.policy,
+                'dropped': self.inbox.dropped,
+                'fanout_depth': {fanout.name: fanout.depth() for fanout in self.fanouts},
+                'processed': processed,
+                'errors': self.errors,
+                'wait_ms': round(1000 * self.wait_total / processed, 3) if processed else 0.0,
+                'latency_ms': round(1000 * self.service_total / processed, 3) if processed else 0.0,
+                'latency_max_ms': round(1000 * self.service_max, 3)
+            }
+
+
+class Pipeline:
+    """
+    A chain of stages connected by bounded queues.
+
+    Attributes:
+        stages (list): The stages in order of creation.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def add_stage(self, name, handler, inbox, outboxes=()):
+        """
+        Creates a stage and adds it to the pipeline.
+
+        Args:
+            name (str): The name of the stage.
+            handler (callable): Processes one item and returns the result, None to consume it.
+            inbox (BoundedQueue): The queue the stage consumes.
+            outboxes (iterable): The queues the results are forwarded to.
+
+        Returns:
+            Stage: The created stage.
+        """
+        stage = Stage(name, handler, inbox, outboxes)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        """
+        Starts all stage threads.
+        """
+        for stage in self.stages:
+            stage.start()
+
+    def join(self, timeout=None):
+        """
+        Waits until all stages drained their queues after the entry queue was closed.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait per stage.
+        """
+        for stage in self.stages:
+            if stage.thread is not None:
+                stage.thread.join(timeout)
+
+    def stats(self):
+        """
+        Returns the statistics of all stages.
+
+        Returns:
+            dict: The statistics per stage name.
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -1,12 +1,11 @@
-import json
-import pandas as pd
+import configparser
 import matplotlib.pyplot as plt
-import glob
 import os
 import logging
 import numpy as np
 from matplotlib.animation import FuncAnimation
-from datetime import datetime
+from measurementData import records_to_arrays, SessionLocator, SessionTailReader
+from topology import load_topology
 
 # Konfigurationsparameter
 CONFIG = {
@@ -14,14 +13,14 @@ CONFIG = {
     'log_dir': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs'),
     'log_file': 'plot.log',
     'plot_interval': 1000,  # Interval in Millisekunden
+    'window_size': 600,  # Angezeigte Samples pro Client
+    'config_path': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.ini'),
     'figsize': (10, 18),
-    'num_subplots': 3,
-    'y_limits': [  # Individuelle y_min und y_max für jedes Diagramm
+    'y_limits': [  # Individuelle y_min und y_max für jedes Diagramm, weitere Diagramme skalieren automatisch
         {'y_min': 10, 'y_max': 18},
         {'y_min': 14, 'y_max': 22},
         {'y_min': 14, 'y_max': 22}
     ],
-    'default_value': 30,  # Standardwert für fehlende Sensordaten
     'line_colors': ['#377eb8', '#e41a1c', '#4daf4a', '#984ea3', '#a65628', '#f781bf', '#ff7f00', '#00CED1'],  # Farben
     'line_styles': ['-', '--', ':', '-.', 'solid', 'dashed', 'dashdot', 'dotted']  # Linienstile
 }
@@ -37,107 +36,164 @@ logging.basicConfig(
     handlers=[logging.FileHandler(LOG_PATH)]
 )
 
-def load_latest_data(folder_path, last_timestamp=None):
-    json_files = glob.glob(os.path.join(folder_path, '*_measurementData.json'))
-    
-    if not json_files:
+def read_topology():
+    config = configparser.ConfigParser()
+    config.read(CONFIG['config_path'])
+    return load_topology(config)
+
+class RingBuffer:
+    """
+    Keeps the newest `capacity` samples of one client. Every sample is written twice, at
+    its position and `capacity` rows later, so the window is always one contiguous slice
+    in time order: appending costs O(new samples) and reading the window copies nothing.
+
+    Attributes:
+        capacity (int): The number of samples kept.
+        count (int): The number of samples currently kept.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.times = np.empty(2 * capacity, dtype='datetime64[us]')
+        self.values = np.full((2 * capacity, channels), np.nan)
+        self.position = 0
+        self.count = 0
+
+    def clear(self):
+        self.position = 0
+        self.count = 0
+
+    def extend(self, times, values):
+        """Appends samples, only the newest `capacity` of them can be kept."""
+        times, values = times[-self.capacity:], values[-self.capacity:]
+        rows = (self.position + np.arange(len(times))) % self.capacity
+        for offset in (0, self.capacity):
+            self.times[rows + offset] = times
+            self.values[rows + offset] = values
+        self.position = (self.position + len(times)) % self.capacity
+        self.count = min(self.count + len(times), self.capacity)
+
+    def window(self):
+        """Returns the times and values of the kept samples, oldest first."""
+        start = self.position + self.capacity - self.count
+        return self.times[start:start + self.count], self.values[start:start + self.count]
+
+
+class PlotBuffer:
+    """
+    The ring buffers of all clients, fed with the records appended to the session file.
+
+    Attributes:
+        topology (Topology): The client topology.
+        buffers (dict): The RingBuffer per client address.
+    """
+
+    def __init__(self, topology, capacity):
+        self.topology = topology
+        self.channels = {role.address: [f"Channel {column}" for column in range(role.channels)] for role in topology.clients}
+        self.buffers = {role.address: RingBuffer(capacity, role.channels) for role in topology.clients}
+
+    def clear(self):
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+    def add(self, records):
+        """
+        Appends records to the buffers of their clients.
+
+        Returns:
+            set: The addresses of the clients that received samples.
+        """
+        per_client = {}
+        for record in records:
+            if record.get('pi-address') in self.buffers:
+                per_client.setdefault(record['pi-address'], []).append(record)
+        for address, client_records in per_client.items():
+            timestamps, values, _ = records_to_arrays(client_records, self.channels[address])
+            self.buffers[address].extend(timestamps, values)
+        return set(per_client)
+
+
+def load_latest_data(locator, reader, buffer):
+    """
+    Parses the records appended to the active session file since the last call and adds
+    them to the buffer. A new session clears the buffer.
+
+    Returns:
+        set: The addresses of the clients whose window changed.
+    """
+    try:
+        latest_file = locator.latest()
+    except FileNotFoundError:
         logging.info("Keine JSON-Dateien im Ordner gefunden.")
-        return []
+        return set()
 
-    sorted_files = sorted(json_files, key=os.path.getmtime, reverse=True)
-    latest_file = sorted_files[0]
-    
-    data = []
-    with open(latest_file, 'r') as file:
-        for line in file:
-            try:
-                record = json.loads(line)
-                if last_timestamp is None or record['timestamp'] > last_timestamp:
-                    if not record['sensor_data']:
-                        record['sensor_data'] = {'default_channel': CONFIG['default_value']}
-                    data.append(record)
-            except json.JSONDecodeError as e:
-                logging.error(f"Fehler beim Laden der JSON-Daten aus Zeile: {e}")
-    
-    return data
+    generation = reader.generation
+    # Only the appended bytes are parsed, missing samples become NaN and leave a gap in the line
+    records = reader.poll(latest_file)
+    if reader.generation == generation:
+        return buffer.add(records)
+    buffer.clear()
+    buffer.add(records)
+    return set(buffer.buffers)
 
-def plot_data(axs, data):
-    if not data:
-        logging.info("Keine Daten vorhanden.")
-        return []
-
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    unique_addresses = df['pi-address'].unique()
-    lines = []
+def plot_data(axs, buffer, topology):
+    lines = {}
 
     for i, ax in enumerate(axs):
         ax.clear()
-        y_limits = CONFIG['y_limits'][i]
-        ax.set_ylim(y_limits['y_min'], y_limits['y_max'])
-
-    for i, pi_address in enumerate(unique_addresses):
-        df_pi = df[df['pi-address'] == pi_address]
-        axs[i].set_title(f'Data of Pi: {pi_address}')
-        axs[i].set_ylabel('Resistance Value')
-
-        sensor_data_keys = df_pi['sensor_data'].apply(lambda x: x.keys() if isinstance(x, dict) else {}).explode().unique()
-        for j, channel in enumerate(sensor_data_keys):
-            values = df_pi['sensor_data'].apply(lambda x: x.get(channel, CONFIG['default_value']) if isinstance(x, dict) else CONFIG['default_value']).to_numpy()
-            timestamps = df_pi['timestamp'].to_numpy()
+        if i < len(CONFIG['y_limits']):
+            y_limits = CONFIG['y_limits'][i]
+            ax.set_ylim(y_limits['y_min'], y_limits['y_max'])
+
+    for role in topology.clients:
+        ax = axs[role.index]
+        ax.set_title(f'Data of Pi: {role.address}')
+        ax.set_ylabel('Resistance Value')
+        timestamps, values = buffer.buffers[role.address].window()
+
+        for j, channel in enumerate(buffer.channels[role.address]):
             color = CONFIG['line_colors'][j % len(CONFIG['line_colors'])]
             style = CONFIG['line_styles'][j % len(CONFIG['line_styles'])]
-            line, = axs[i].plot(timestamps, values, label=channel, color=color, linestyle=style)
-            lines.append(line)
+            line, = ax.plot(timestamps, values[:, j], label=channel, color=color, linestyle=style)
+            lines[(role.address, j)] = line
 
-        axs[i].legend(loc='upper left')
-        axs[i].grid(True)
+        ax.legend(loc='upper left')
+        ax.grid(True)
 
     axs[-1].set_xlabel('Timestamp')
     plt.tight_layout()
     
     return lines
 
-def update_plot(frame, folder_path, axs, lines, last_timestamp):
-    new_data = load_latest_data(folder_path, last_timestamp)
-    if not new_data:
-        return last_timestamp
-
-    last_timestamp = new_data[-1]['timestamp']
-    df = pd.DataFrame(new_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    unique_addresses = df['pi-address'].unique()
-    line_index = 0
+def update_plot(frame, locator, reader, buffer, axs, lines):
+    updated = load_latest_data(locator, reader, buffer)
+    if not updated:
+        return
 
-    for i, pi_address in enumerate(unique_addresses):
-        df_pi = df[df['pi-address'] == pi_address]
-
-        sensor_data_keys = df_pi['sensor_data'].apply(lambda x: x.keys() if isinstance(x, dict) else {}).explode().unique()
-        for channel in sensor_data_keys:
-            values = df_pi['sensor_data'].apply(lambda x: x.get(channel, CONFIG['default_value']) if isinstance(x, dict) else CONFIG['default_value']).to_numpy()
-            timestamps = df_pi['timestamp'].to_numpy()
-            lines[line_index].set_data(timestamps, values)
-            line_index += 1
+    for address in updated:
+        # The lines show the whole window of the ring buffer, not only the new samples
+        timestamps, values = buffer.buffers[address].window()
+        for column in range(values.shape[1]):
+            lines[(address, column)].set_data(timestamps, values[:, column])
 
     for ax in axs:
         ax.relim()
         ax.autoscale_view()
 
-    plt.tight_layout()
-    return last_timestamp
-
 def main():
-    folder_path = CONFIG['data_dir']
+    locator = SessionLocator(CONFIG['data_dir'])
+    reader = SessionTailReader(window_size=0)
     
-    fig, axs = plt.subplots(CONFIG['num_subplots'], 1, figsize=CONFIG['figsize'], sharex=True)
-    last_timestamp = None
-    initial_data = load_latest_data(folder_path, last_timestamp)
-    lines = plot_data(axs, initial_data)
-    last_timestamp = initial_data[-1]['timestamp'] if initial_data else None
+    topology = read_topology()
+    buffer = PlotBuffer(topology, CONFIG['window_size'])
+    fig, axs = plt.subplots(len(topology.clients), 1, figsize=CONFIG['figsize'], sharex=True, squeeze=False)
+    axs = axs[:, 0]
+    load_latest_data(locator, reader, buffer)
+    lines = plot_data(axs, buffer, topology)
     
-    ani = FuncAnimation(fig, update_plot, fargs=(folder_path, axs, lines, last_timestamp), interval=CONFIG['plot_interval'])
+    # The reader and the buffer carry the state between the updates, no timestamp has to be passed back
+    ani = FuncAnimation(fig, update_plot, fargs=(locator, reader, buffer, axs, lines), interval=CONFIG['plot_interval'])
     logging.info("Plotting session started")
     plt.show()
 
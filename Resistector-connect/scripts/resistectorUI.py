@@ -1,23 +1,247 @@
 import os
 import json
+import gzip
+import zlib
 import logging
 import configparser
 import uuid
-import copy
+import time
+import threading
 import numpy as np
-from collections import defaultdict, deque
+from collections import deque, namedtuple
 from datetime import datetime
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_cors import CORS
+from frameBus import FrameSubscriber
+from measurementData import normalize_record, SessionTailReader, SessionLocator
+from topology import load_topology, clean_value
+from components import load_component_library
+from history import HistoryStore
+from detection import Baseline, HysteresisRegisters, RunningStatistics, ComponentDetector, GridStore, frame_to_array, STATE_CODES, STATE_NAMES
+
+
+DisplaySnapshot = namedtuple('DisplaySnapshot', ['version', 'state', 'grid', 'size', 'body', 'etag'])
+DisplaySnapshot.__doc__ = """
+Immutable display state of one processed frame.
+
+Attributes:
+    version (int): Increases with every processed frame that changed the display state.
+    state (dict): The components and the system state, must not be modified. The cells are
+        only kept in `grid`, the measurement timestamp in BoardContext.timestamp.
+    grid (bytes): The cell states packed row by row, one digit (state code) per cell.
+    size (tuple): The grid size (x_dim, y_dim).
+    body (bytes): The display state serialized as compact JSON response body.
+    etag (str): Entity tag of the snapshot, unique across restarts of the UI, sent as weak
+        validator since every representation of the snapshot shares it.
+"""
+
+
+def diff_components(old, new):
+    """
+    Compares the components of two display states.
+
+    Returns:
+        tuple: The added or changed components per id and the ids of the removed components.
+    """
+    changed = {key: component for key, component in new.items() if old.get(key) != component}
+    return changed, [key for key in old if key not in new]
+
+
+def compact_components(components):
+    """Returns the components as [id, type, x, y, orientation] lists, orientation `h` or `v`."""
+    return [[key, component['type'], component['x'], component['y'], component['orientation'][0]] for key, component in components.items()]
+
+
+def changed_indices(old, new):
+    """Returns the indices of the cells that differ between the packed grids of two snapshots of the same size."""
+    return np.flatnonzero(np.frombuffer(old.grid, dtype=np.uint8) != np.frombuffer(new.grid, dtype=np.uint8))
+
+
+def verbose_cells(snapshot, indices=None):
+    """
+    Spells out cells of a snapshot as `x,y` keyed states, the verbose format.
+
+    Args:
+        snapshot (DisplaySnapshot): The snapshot.
+        indices (iterable, optional): The indices of the cells in the packed grid, all cells if omitted.
+
+    Returns:
+        dict: The state of every cell.
+    """
+    width = snapshot.size[0]
+    grid = snapshot.grid
+    if indices is None:
+        indices = range(len(grid))
+    return {f"{index % width},{index // width}": {'State': STATE_NAMES[grid[index] - ord('0')]} for index in indices}
+
+
+def encode_verbose_state(snapshot):
+    """Serializes a snapshot in the verbose format, meant for debugging."""
+    return json.dumps(dict(snapshot.state, displayData=verbose_cells(snapshot)), separators=(',', ':')).encode('utf-8')
+
+
+def encode_compact_state(snapshot):
+    """
+    Serializes a snapshot in the compact format. The grid is one string with the state code
+    of every cell, row by row (index y * x_dim + x).
+
+    Returns:
+        bytes: The JSON body.
+    """
+    state = snapshot.state
+    compact = {
+        'version': snapshot.version,
+        'format': 'compact',
+        'size': list(snapshot.size),
+        'grid': snapshot.grid.decode('ascii'),
+        'components': compact_components(state['components']),
+        'SystemState': state['SystemState']
+    }
+    return json.dumps(compact, separators=(',', ':')).encode('utf-8')
+
+
+def encode_compact_delta(old, new):
+    """
+    Serializes the changes between two snapshots in the compact format. `cells` holds
+    alternately the index and the new state code of every changed cell.
+
+    Returns:
+        bytes: The JSON body, the full state if the grid size changed.
+    """
+    if old.size != new.size:
+        return encode_compact_state(new)
+    new_codes = np.frombuffer(new.grid, dtype=np.uint8)
+    changed_cells = changed_indices(old, new)
+    changed, removed = diff_components(old.state['components'], new.state['components'])
+    delta = {
+        'version': new.version,
+        'since': old.version,
+        'delta': True,
+        'format': 'compact',
+        'size': list(new.size),
+        'cells': np.column_stack((changed_cells, new_codes[changed_cells] - ord('0'))).ravel().tolist(),
+        'components': compact_components(changed),
+        'removed': removed,
+        'SystemState': new.state['SystemState']
+    }
+    return json.dumps(delta, separators=(',', ':')).encode('utf-8')
+
+
+def compress_body(body, encoding):
+    """Compresses a response body with the content coding `gzip` or `deflate`."""
+    return gzip.compress(body, compresslevel=6) if encoding == 'gzip' else zlib.compress(body, 6)
+
+
+def encode_verbose_delta(old, new):
+    """
+    Serializes the changes between two snapshots in the verbose format.
+
+    Args:
+        old (DisplaySnapshot): The snapshot the client has.
+        new (DisplaySnapshot): The current snapshot.
+
+    Returns:
+        bytes: The JSON body with the changed cells, the added or changed components and the
+        ids of the removed components, the full state if the grid size changed.
+    """
+    if old.size != new.size:
+        return encode_verbose_state(new)
+    components, removed = diff_components(old.state['components'], new.state['components'])
+    delta = {
+        'version': new.version,
+        'since': old.version,
+        'delta': True,
+        'displayData': verbose_cells(new, changed_indices(old, new).tolist()),
+        'components': components,
+        'removedComponents': removed,
+        'SystemState': new.state['SystemState']
+    }
+    return json.dumps(delta, separators=(',', ':')).encode('utf-8')
+
+Settings = namedtuple('Settings', ['threshold', 'hysteresis', 'x_dim', 'y_dim'])
+Settings.__doc__ = """Validated snapshot of the settings used on the detection and request hot path."""
 
 
 class ConfigManager:
-    """Manages reading and cleaning configuration data."""
-    
+    """
+    Manages reading and cleaning configuration data. `shared` returns one instance per
+    file for the whole process, which re-parses the file only when its mtime changes.
+    """
+
+    CHECK_INTERVAL = 1.0  # Minimum seconds between two mtime checks
+    _instances = {}
+    _instances_lock = threading.Lock()
+
     def __init__(self, config_path):
+        self.config_path = config_path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked_at = 0.0
         self.config = configparser.ConfigParser()
         self.config.read(config_path)
-    
+        self.settings = self.validate(self.config)
+        if os.path.exists(config_path):
+            self.mtime = os.stat(config_path).st_mtime_ns
+
+    @classmethod
+    def shared(cls, config_path):
+        """Returns the process-wide instance for a configuration file."""
+        instance = cls._instances.get(config_path)
+        if instance is None:
+            with cls._instances_lock:
+                instance = cls._instances.get(config_path)
+                if instance is None:
+                    instance = cls._instances[config_path] = cls(config_path)
+        instance.refresh()
+        return instance
+
+    def refresh(self):
+        """Reloads the configuration if the file changed since it was read."""
+        now = time.monotonic()
+        if now - self.checked_at < self.CHECK_INTERVAL:
+            return
+        with self.lock:
+            if now - self.checked_at < self.CHECK_INTERVAL:
+                return
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.config_path).st_mtime_ns
+            except OSError:
+                return
+            if mtime == self.mtime:
+                return
+            self.mtime = mtime
+            config = configparser.ConfigParser()
+            try:
+                config.read(self.config_path)
+                settings = self.validate(config)
+            except (configparser.Error, KeyError, ValueError) as e:
+                Logger.error(f"Invalid configuration, keeping the previous one: {e}")
+                return
+            # Readers always see either the old or the new configuration, never a mix
+            self.config, self.settings = config, settings
+            Logger.info(f"Configuration reloaded: {settings}")
+
+    @classmethod
+    def validate(cls, config):
+        """Parses and checks the hot path settings of a configuration."""
+        def value(section, option):
+            return cls.clean_value(config[section][option])
+
+        settings = Settings(
+            threshold=float(value('Local-Settings', 'threshold')),
+            hysteresis=int(value('Local-Settings', 'hysteresis')),
+            x_dim=int(value('Web-UI', 'amountX-Axis')),
+            y_dim=int(value('Web-UI', 'amountY-Axis'))
+        )
+        if settings.threshold < 0:
+            raise ValueError("threshold must not be negative")
+        if settings.hysteresis < 1:
+            raise ValueError("hysteresis must be at least 1")
+        if settings.x_dim < 1 or settings.y_dim < 1:
+            raise ValueError("amountX-Axis and amountY-Axis must be at least 1")
+        return settings
+
     def get_value(self, section, option, is_float=False, is_int=False):
         value = self.clean_value(self.config[section][option])
         if is_float:
@@ -26,10 +250,7 @@ class ConfigManager:
             return int(value)
         return value
     
-    @staticmethod
-    def clean_value(value):
-        """Cleans the value of comments and whitespace."""
-        return value.split(';')[0].split('#')[0].strip()
+    clean_value = staticmethod(clean_value)
 
 
 class Logger:
@@ -65,499 +286,925 @@ class Logger:
         werkzeug_logger.setLevel(logging.ERROR)  # Only log errors from Werkzeug
 
 class SensorDataManager:
-    """Manages loading, processing, and storing sensor data."""
+    """
+    Manages loading, processing, and storing sensor data. Several boards can share one
+    session reader, each manager only sees the records of its own clients.
+    """
+
+    MAX_FRAMES = 50
+    BASELINE_WINDOW = 50
     
-    def __init__(self, data_dir):
+    def __init__(self, data_dir, topology, locator=None, reader=None):
         self.data_dir = data_dir
-        self.mean_values = defaultdict(lambda: defaultdict(lambda: deque(maxlen=50)))
-        self.result_register = {}
-        self.channel_level_register = {}
-        self.display_data = {}
-        self.previous_display_data = {}
+        self.topology = topology
+        clients_per_frame = self.clients_per_frame = len(topology.clients)
+        self.addresses = set(topology.addresses)
+        self.locator = locator or SessionLocator(data_dir)
+        self.reader = reader or SessionTailReader(window_size=clients_per_frame * self.MAX_FRAMES, head_size=clients_per_frame * self.MAX_FRAMES)
+        self.baseline = Baseline(clients_per_frame, topology.max_channels, self.BASELINE_WINDOW)
+        self.registers = HysteresisRegisters(clients_per_frame, topology.max_channels)
+        self.display_grid = None
         self.newest_timestamp = ""
     
     def get_latest_file(self):
         """Finds the latest measurement file in the data directory."""
-        files = [f for f in os.listdir(self.data_dir) if f.endswith('_measurementData.json')]
-        if not files:
+        try:
+            return self.locator.latest()
+        except FileNotFoundError:
             Logger.error(f"No measurement data files found in: {self.data_dir}")
-            raise FileNotFoundError(f"No measurement data files found in: {self.data_dir}")
-        latest_file = max(files, key=lambda f: os.path.getctime(os.path.join(self.data_dir, f)))
-        return os.path.join(self.data_dir, latest_file)
+            raise
     
     def read_sensor_data(self):
-        """Reads the latest sensor data from the JSON file."""
-        latest_file = self.get_latest_file()
-        data = []
-        with open(latest_file) as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                f.seek(0)
-                for line in f:
-                    try:
-                        data.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
-        return data
+        """Parses the records appended to the latest JSON file since the last call."""
+        return self.reader.poll(self.get_latest_file())
     
     def get_oldest_sensor_data(self, amount):
-        """Returns the oldest sensor data."""
-        data = self.read_sensor_data()
-        return data[:3 * amount]
+        """Returns the oldest sensor data (at most MAX_FRAMES frames)."""
+        self.read_sensor_data()
+        records = self.own_records(self.reader.oldest(self.reader.head_size))
+        return records[:self.clients_per_frame * amount]
     
     def get_newest_sensor_data(self, amount):
-        """Returns the newest sensor data."""
-        data = self.read_sensor_data()
-        new_data = data[-3 * amount:]
+        """Returns the newest sensor data (at most MAX_FRAMES frames)."""
+        self.read_sensor_data()
+        new_data = self.own_records(self.reader.newest(self.reader.window_size))
+        new_data = new_data[max(len(new_data) - self.clients_per_frame * amount, 0):]
         self.update_newest_timestamp(new_data)
         return new_data
+
+    def own_records(self, records):
+        """Returns the records of the clients of this board."""
+        return [record for record in records if record.get('pi-address') in self.addresses]
     
     def update_newest_timestamp(self, timestamp_data):
         """Updates the newest timestamp based on the sensor data."""
         self.newest_timestamp = max(timestamp_data, key=lambda x: datetime.fromisoformat(x['timestamp']))['timestamp']
     
-    def calculate_means(self, sensor_data, pi_address=None, channels=None):
-        """Calculates the means of the sensor data."""
-        if pi_address and channels:
-            for channel in channels:
-                channel = f"Kanal {channel}"
-                self.mean_values[pi_address][channel].clear()
-
+    def calculate_means(self, sensor_data, selected=None):
+        """Adds the sensor data (optionally only of the selected channels) to the baseline."""
+        # The baseline window is extended by the new samples, not replaced
         for entry in sensor_data:
-            entry_pi_address = entry['pi-address']
-            if pi_address and entry_pi_address != pi_address:
-                continue
-
-            for channel, value in entry['sensor_data'].items():
-                if channels and channel not in channels:
-                    continue
-
-                self.mean_values[entry_pi_address][channel].append(value)
+            values = frame_to_array([entry], self.topology)
+            if selected is not None:
+                values[~selected] = np.nan
+            self.baseline.append(values)
     
     def get_means(self):
-        """Returns the calculated means."""
-        means = {}
-        for pi_address, channels in self.mean_values.items():
-            means[pi_address] = {}
-            for channel, values in channels.items():
-                if len(values) > 0:
-                    means[pi_address][channel] = np.mean(values)
-                else:
-                    means[pi_address][channel] = np.nan  # Oder ein anderer Standardwert, z.B. 0
-        return means
+        """Returns the baseline means as clients x channels array (NaN without baseline)."""
+        return self.baseline.means()
 
     
-    def process_sensor_data(self):
+    def process_sensor_data(self, current_sensor_data=None):
         """Processes the sensor data by calculating means and updating states."""
-        if not self.mean_values:
+        if self.baseline.is_empty():
             self.calculate_means(self.get_oldest_sensor_data(50))
         means = self.get_means()
-        self.calculate_sensor_data_in_mean(means)
+        self.calculate_sensor_data_in_mean(means, current_sensor_data)
+
+    def process_frame(self, records):
+        """Runs the detection for one ingested frame (one record per client)."""
+        self.update_newest_timestamp(records)
+        self.process_sensor_data(records)
     
-    def calculate_sensor_data_in_mean(self, means):
+    def calculate_sensor_data_in_mean(self, means, current_sensor_data=None):
         """Compares sensor data with the means and updates the result register."""
-        config = ConfigManager(CONFIG_PATH)
-        threshold = config.get_value('Local-Settings', 'threshold', is_float=True)
-        hysteresis_value = config.get_value('Local-Settings', 'hysteresis', is_int=True)
+        settings = ConfigManager.shared(CONFIG_PATH).settings
+        threshold = settings.threshold
+        hysteresis_value = settings.hysteresis
 
-        current_sensor_data = self.get_newest_sensor_data(1)
+        if current_sensor_data is None:
+            current_sensor_data = self.get_newest_sensor_data(1)
         Logger.debug(f"Current means: {means}")
         Logger.debug(f"Current sensor data: {current_sensor_data}")
 
-        for data in current_sensor_data:
-            address = data["pi-address"]
-            sensor_data = data["sensor_data"]
-
-            if address not in means:
-                continue
-
-            if address not in self.result_register:
-                self.result_register[address] = {channel: 0 for channel in sensor_data.keys()}
-
-            for channel, value in sensor_data.items():
-                mean_value = means[address].get(channel)
-                if mean_value is None:
-                    continue
-
-                if mean_value - threshold > value:
-                    self.result_register[address][channel] -= 1
-                elif mean_value + threshold < value:
-                    self.result_register[address][channel] += 1
-                else:
-                    self.result_register[address][channel] = 0
-
-                if CalibrationManager.is_calibration_running:
-                    if self.result_register[address][channel] != 0:
-                        self.calculate_means(self.get_newest_sensor_data(5), address, [channel])
-                else:
-                    if self.result_register[address][channel] >= hysteresis_value:
-                        Logger.debug(f"Above threshold: {address} {channel}")
-                        self.result_register[address][channel] = 0
-                        self.run_hysteresis_condition(address, channel, "up")
-                    elif self.result_register[address][channel] <= -hysteresis_value:
-                        Logger.debug(f"Below threshold: {address} {channel}")
-                        self.result_register[address][channel] = 0
-                        self.run_hysteresis_condition(address, channel, "down")
-        Logger.debug(f"Result register: {self.result_register}")
-    
-    def run_hysteresis_condition(self, address, channel, condition):
-        """Updates the channel register based on the hysteresis condition."""
-        if address not in self.channel_level_register:
-            self.channel_level_register[address] = {}
-        if channel not in self.channel_level_register[address]:
-            self.channel_level_register[address][channel] = {"level": 0, "lifetime": 10}
-
-        if condition == "up":
-            self.channel_level_register[address][channel]["level"] = 1
-        elif condition == "down":
-            self.channel_level_register[address][channel]["level"] = -1
-
-        Logger.debug(f"Channel level register: {self.channel_level_register}")
-        self.calculate_means(self.get_newest_sensor_data(5), address, [channel])
+        values = frame_to_array(current_sensor_data, self.topology)
+        valid = ~np.isnan(values) & ~np.isnan(means)
+        # -1 below, +1 above and 0 within the threshold band around the baseline
+        with np.errstate(invalid='ignore'):
+            deviation = (values > means + threshold).astype(np.int8) - (values < means - threshold)
+
+        self.registers.count(deviation, valid)
+
+        rebaseline = self.registers.detect(hysteresis_value, valid)
+        if rebaseline.any():
+            Logger.debug(f"Hysteresis crossed: {np.argwhere(rebaseline).tolist()}, levels: {self.registers.level[rebaseline].tolist()}")
+            self.calculate_means(self.get_newest_sensor_data(5), rebaseline)
+        Logger.debug(f"Result register: {self.registers.counter.tolist()}")
     
     def get_system_state(self):
-        config = ConfigManager(CONFIG_PATH)
-        hysteresis_value = config.get_value('Local-Settings', 'hysteresis', is_int=True)
         """Determines the system state based on the current registers."""
-        if self.channel_level_register:
+        hysteresis_value = ConfigManager.shared(CONFIG_PATH).settings.hysteresis
+        if self.registers.active().any():
             return "Red"
-
-        all_zeros = True
-        for channels in self.result_register.values():
-            if any(value > hysteresis_value / 2 or value < -hysteresis_value / 2 for value in channels.values()):
-
-                all_zeros = False
-                break
-        
-        if all_zeros:
-            return "Green"
-        else:
+        if (np.abs(self.registers.counter) > hysteresis_value / 2).any():
             return "Yellow"
+        return "Green"
     
     def reset_display_data(self):
         """Resets the display data."""
-        self.display_data.clear()
-        self.previous_display_data.clear()
+        self.display_grid = None
 
 
-class CalibrationManager:
-    """Responsible for performing and monitoring calibration."""
-    
-    is_calibration_running = False
-    calibration_status = {'status': 'Not Started'}
-    
-    @classmethod
-    def start_calibration(cls, sensor_manager):
-        """Starts the calibration routine."""
-        cls.calibration_status = {'status': 'In Progress'}
-        cls.is_calibration_running = True
+class ChangeNotifier:
+    """Wakes up waiting stream responses when the display state or the calibration status changes."""
 
-        if not sensor_manager.mean_values:
-            sensor_manager.calculate_means(sensor_manager.get_oldest_sensor_data(50))
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
 
-        means = sensor_manager.get_means()
-        sensor_manager.calculate_sensor_data_in_mean(means)
+    def notify(self):
+        """Signals a change to all waiting threads."""
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
 
-        while not cls.is_calibration_successful(sensor_manager):
-            means = sensor_manager.get_means()
-            sensor_manager.calculate_sensor_data_in_mean(means)
+    def wait(self, version, timeout):
+        """Waits until a change after `version` was signalled or the timeout passed and returns the current version."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
 
-        sensor_manager.reset_display_data()
-        Logger.debug("Calibration completed")
-        cls.calibration_status = {'status': 'Completed'}
-        cls.is_calibration_running = False
-        return True
+
+class CalibrationManager:
+    """
+    Responsible for performing and monitoring calibration. A calibration is a job that is
+    advanced by the detection worker with every ingested frame, so starting it never blocks.
+    The baseline is rebuilt from the samples of the job, which completes as soon as the
+    confidence interval of every channel mean is narrower than the detection threshold.
+    Request threads only queue a job, it is started by the detection worker, the only
+    thread that changes the baseline and the registers.
+    """
     
-    @classmethod
-    def is_calibration_successful(cls, sensor_manager):
-        """Checks if the calibration has been successfully completed."""
-        config = ConfigManager(CONFIG_PATH)
-        hysteresis_check = config.get_value('Local-Settings', 'hysteresis', is_int=True) + 2
-
-        while cls.is_calibration_running or hysteresis_check > 0:
-            if not cls.is_calibration_running:
-                hysteresis_check -= 1
-            for address, channels in sensor_manager.result_register.items():
-                for channel, value in channels.items():
-                    if value != 0:
-                        Logger.debug("Calibration values not okay")
-                        cls.is_calibration_running = True
-                        return False
-            Logger.debug("Calibration values okay")
-            cls.is_calibration_running = False
-
-        return True
+    CONFIDENCE_Z = 1.96  # 95 % confidence interval of the baseline mean
+    MIN_SAMPLES = 3  # Samples needed before a channel can converge
+
+    def __init__(self, on_change=None):
+        self.is_calibration_running = False
+        self.calibration_status = {'status': 'Not Started'}
+        self.job_id = None
+        self.frames = 0
+        self.statistics = None
+        self.on_change = on_change  # Called whenever the calibration status changes
+        self.lock = threading.Lock()  # Guards the hand-over of queued jobs to the detection worker
+        self.pending_job_id = None
+
+    def status(self):
+        """Returns the calibration status, including a job that is queued but not started yet."""
+        pending_job_id = self.pending_job_id
+        if pending_job_id is not None:
+            return {'status': 'Pending', 'job_id': pending_job_id, 'frames': 0, 'channels': {}}
+        return self.calibration_status
+
+    def is_active(self):
+        """Checks whether a calibration job is queued or running."""
+        return self.pending_job_id is not None or self.is_calibration_running
+
+    def request_calibration(self):
+        """Queues a calibration job, or returns the id of the one already queued or running."""
+        with self.lock:
+            if self.is_calibration_running:
+                return self.job_id
+            if self.pending_job_id is not None:
+                return self.pending_job_id
+            job_id = self.pending_job_id = uuid.uuid4().hex
+        if self.on_change is not None:
+            self.on_change()
+        return job_id
+
+    def start_pending(self, sensor_manager):
+        """Starts the queued calibration job, if any. Called by the detection worker."""
+        if self.pending_job_id is None:
+            return
+        with self.lock:
+            # The job reports its own status before it stops being pending, so status() never
+            # shows the previous job in between
+            self.start_calibration(sensor_manager, self.pending_job_id)
+            self.pending_job_id = None
+
+    def set_status(self, status, channels=None):
+        """Updates the calibration status and reports the change."""
+        self.calibration_status = {'status': status, 'job_id': self.job_id, 'frames': self.frames, 'channels': channels or {}}
+        if self.on_change is not None:
+            self.on_change()
+
+    def start_calibration(self, sensor_manager, job_id):
+        """Starts a calibration job."""
+        self.job_id = job_id
+        self.frames = 0
+        self.statistics = RunningStatistics(*sensor_manager.baseline.count.shape)
+        sensor_manager.baseline.clear()
+        sensor_manager.registers.counter.fill(0)
+        self.is_calibration_running = True
+        self.set_status('In Progress')
+        Logger.info(f"Calibration job {self.job_id} started")
+
+    def process_frame(self, sensor_manager, records):
+        """Advances the running calibration job by one frame."""
+        values = frame_to_array(records, sensor_manager.topology)
+        self.statistics.update(values)
+        sensor_manager.baseline.append(values)
+        self.frames += 1
+
+        threshold = ConfigManager.shared(CONFIG_PATH).settings.threshold
+        width = self.statistics.confidence_width(self.CONFIDENCE_Z)
+        sampled = self.statistics.count > 0
+        converged = (self.statistics.count >= self.MIN_SAMPLES) & (width < threshold)
+        channels = self.channel_status(sensor_manager, width, converged)
+
+        # Channels that never delivered a sample do not hold the calibration back
+        if not sampled.any() or (sampled & ~converged).any():
+            self.set_status('In Progress', channels)
+            return
+
+        sensor_manager.registers.counter.fill(0)
+        sensor_manager.reset_display_data()
+        Logger.info(f"Calibration job {self.job_id} completed after {self.frames} frames")
+        with self.lock:
+            self.is_calibration_running = False
+            self.set_status('Completed', channels)
+
+    def channel_status(self, sensor_manager, width, converged):
+        """Returns per client and channel the samples, the confidence interval width and whether it converged."""
+        statistics = self.statistics
+        status = {}
+        for role in sensor_manager.topology.clients:
+            channels = status[role.address] = {}
+            for column in range(role.channels):
+                samples = int(statistics.count[role.index, column])
+                channels[f"Channel {column}"] = {
+                    'samples': samples,
+                    'mean': round(float(statistics.mean[role.index, column]), 6) if samples else None,
+                    'ci_width': round(float(width[role.index, column]), 6) if samples > 1 else None,
+                    'converged': bool(converged[role.index, column])
+                }
+        return status
 
 
 class DisplayDataManager:
     """Manages the display and component recognition logic."""
 
-    def __init__(self, sensor_manager):
+    COMPONENT_LIBRARY = os.path.join(os.path.dirname(__file__), 'static', 'Bauteilbilder', 'logic.txt')
+
+    def __init__(self, sensor_manager, topology, library=None):
         self.sensor_manager = sensor_manager
-        self.old_detected_components = {}
-        self.detection_counter = {}
+        self.topology = topology
+        if library is None:
+            library = load_component_library(self.COMPONENT_LIBRARY)
+        patterns = [(component.name, component.states) for component in library]
+        required_counts = {component.name: component.confirmations for component in library}
+        self.detector = ComponentDetector(patterns, required_counts)
+        self.packed = None  # State code digits of all cells, row by row, kept in sync with the grid
+        self.applied_lines = None
+
+    def get_grid(self, x_dim, y_dim):
+        """Returns the display state grid, (re)allocated if missing or resized."""
+        grid = self.sensor_manager.display_grid
+        if grid is None or grid.shape != (x_dim, y_dim):
+            grid = GridStore(x_dim, y_dim) if grid is None else grid.resized(x_dim, y_dim)
+            self.sensor_manager.display_grid = grid
+            self.applied_lines = None
+            self.packed = bytearray((grid.array().T + ord('0')).astype(np.uint8).tobytes())
+        return grid
 
     def prepare_display_data(self):
-        """Converts sensor data into a display format."""
-        config = ConfigManager(CONFIG_PATH)
-        x_dim = config.get_value('Web-UI', 'amountX-Axis', is_int=True)
-        y_dim = config.get_value('Web-UI', 'amountY-Axis', is_int=True)
-
-        for x in range(x_dim):
-            for y in range(y_dim):
-                key = f"{x},{y}"
-                self.sensor_manager.display_data[key] = {'State': 'O'}
-                if key in self.sensor_manager.previous_display_data:
-                    self.sensor_manager.display_data[key]['State'] = self.sensor_manager.previous_display_data[key]['State']
-
-        self.update_component_levels(x_dim, y_dim) # ist es X, XX oder O -> Es kommt ein DisplayData Datensatz raus
-        self.sensor_manager.previous_display_data = self.sensor_manager.display_data.copy()
-        detected_components = self.find_components(x_dim, y_dim)
-        self.old_detected_components = copy.deepcopy(detected_components)
+        """Applies the detected channel levels to the display grid and detects the components on it."""
+        settings = ConfigManager.shared(CONFIG_PATH).settings
+        # Cells keep their state until a detected channel level changes it
+        grid = self.get_grid(settings.x_dim, settings.y_dim)
+
+        self.update_component_levels(grid) # ist es X, XX oder O -> Es kommt ein DisplayData Datensatz raus
+        x_dim = grid.shape[0]
+        for x, y, code in grid.take_changes():
+            self.packed[y * x_dim + x] = ord('0') + code
+        detected_components = self.find_components(grid)
         self.delete_lifetime()
 
         return {
-            'displayData': self.sensor_manager.display_data,
-            'components': detected_components,
-            'timestamp': self.sensor_manager.newest_timestamp
+            'components': detected_components
         }
 
-    def update_component_levels(self, x_dim, y_dim):
+    def packed_grid(self):
+        """Returns the state codes of all cells as digits, row by row."""
+        return bytes(self.packed)
+
+    def update_component_levels(self, grid):
         """Determines the states of various components on the display."""
-        x_coords_negative, y_coords_negative, logic_dim_negative = set(), set(), set()
-        x_coords_positive, y_coords_positive, logic_dim_positive = set(), set(), set()
+        x_dim, y_dim = grid.shape
+        lines = {level: {'x': set(), 'y': set(), 'logic_x': set(), 'logic_y': set()} for level in (-1, 1)}
+
+        registers = self.sensor_manager.registers
+        for index, column in zip(*np.nonzero(registers.active())):
+            role = self.topology.clients[index]
+            category = role.axis if role.layer == 'bb' else f"logic_{role.axis}"
+            level = int(registers.level[index, column])
+            coordinate = role.offset + int(column)
+            if level in lines and coordinate < (x_dim if category.endswith('x') else y_dim):
+                lines[level][category].add(coordinate)
+
+        # The cell states only depend on the active lines, unchanged lines leave every cell as it is
+        if lines == self.applied_lines:
+            return
+        self.applied_lines = lines
+        self._update_display_data(grid, lines[-1], 'X', 'XX')
+        self._update_display_data(grid, lines[1], 'O', 'O')
+
+    def _update_display_data(self, grid, lines, state, logic_state):
+        """Updates the cells at the crossings of the active lines."""
+        xs = np.array(sorted(lines['x']), dtype=np.int64)
+        ys = np.array(sorted(lines['y']), dtype=np.int64)
+        logic = np.isin(xs, list(lines['logic_x']))[:, None] | np.isin(ys, list(lines['logic_y']))[None, :]
+        codes = np.where(logic, STATE_CODES[logic_state], STATE_CODES[state]).astype(np.int8)
+        grid.assign(xs, ys, codes)
+        if len(xs) and len(ys) and logic.any():
+            Logger.debug(f"Logical layer detected at {[(int(xs[i]), int(ys[j])) for i, j in np.argwhere(logic)]}")
+
+    def find_components(self, grid):
+        """Detects components on the display based on known patterns."""
+        return self.detector.detect(grid)
 
-        for address, channels in self.sensor_manager.channel_level_register.items():
-            for channel, data in channels.items():
-                level = data["level"]
-                channel_number = int(''.join(filter(str.isdigit, channel)))
+    def delete_lifetime(self):
+        """Reduces the lifetime of the detected channel levels and clears expired ones."""
+        self.sensor_manager.registers.decay()
+
+
+class BoardContext:
+    """
+    State of one board: detection, calibration and the published display snapshots. The
+    detection worker is the only thread that changes the detection state (single writer).
+    Request threads read the current DisplaySnapshot, which is never modified once published,
+    and queue commands like a calibration for the worker, so the hot path takes no lock.
+
+    A new snapshot (version, entity tag) is only published if the display state changed,
+    the timestamp of the newest measurement is kept outside of it in `timestamp`. A board
+    nobody views stops keeping snapshot history and serialized bodies (`serving` is False),
+    its detection goes on.
+    """
+
+    HISTORY_SIZE = 32  # Snapshots kept to answer delta requests
+
+    def __init__(self, board, topology, data_dir, library, session, locator=None, reader=None):
+        self.board = board
+        self.topology = topology
+        self.sensor_manager = SensorDataManager(data_dir, topology, locator, reader)
+        self.display_manager = DisplayDataManager(self.sensor_manager, topology, library)
+        self.changes = ChangeNotifier()
+        self.calibration = CalibrationManager(self.changes.notify)
+        self.client_ips = set(topology.addresses)
+        self.pending_frame = {}
+        self.snapshot = None
+        self.timestamp = None
+        self.history = deque(maxlen=self.HISTORY_SIZE)
+        self.body_cache = {}
+        self.serving = False  # Set by the first viewer
+        self.session = session
+        self.stats_lock = threading.Lock()  # Guards the request statistics, written by request threads
+        self.streams = 0
+        self.created = self.last_used = time.monotonic()
+        self.frames = 0
+        self.failed_frames = 0
+        self.frame_seconds = 0.0
+        self.max_frame_seconds = 0.0
+        self.requests = 0
+        self.not_modified = 0
+
+    def touch(self):
+        """Marks the board as used by a viewer."""
+        with self.stats_lock:
+            self.last_used = time.monotonic()
+            self.requests += 1
+            self.serving = True
+
+    def count_not_modified(self):
+        """Registers a request answered with 304 Not Modified."""
+        with self.stats_lock:
+            self.not_modified += 1
+
+    def count_stream(self, change):
+        """Registers an opened (1) or closed (-1) stream."""
+        with self.stats_lock:
+            self.streams += change
+            self.last_used = time.monotonic()
+            self.serving = True
+
+    def is_idle(self, now, idle_timeout):
+        """Checks whether nobody used the board for `idle_timeout` seconds."""
+        if self.streams or self.calibration.is_active():
+            return False
+        return now - self.last_used > idle_timeout
+
+    def release(self):
+        """
+        Releases the serving state of a board nobody views. The cached bodies are dropped
+        right away, the snapshot history by the detection worker with the next frame.
+        """
+        self.serving = False
+        self.body_cache = {}
+
+    def add_record(self, record):
+        """
+        Collects the records of one polling cycle. A record of a client that is already part
+        of the pending frame completes that frame early.
+
+        Returns:
+            list: The completed frames, each a list of records.
+        """
+        frames = []
+        if record.get('pi-address') in self.pending_frame:
+            frames.append(list(self.pending_frame.values()))
+            self.pending_frame = {}
+        self.pending_frame[record.get('pi-address')] = record
+        if self.client_ips.issubset(self.pending_frame):
+            frames.append(list(self.pending_frame.values()))
+            self.pending_frame = {}
+        return frames
+
+    def process_frame(self, records):
+        """
+        Advances the detector by one frame and stores the resulting display state.
+
+        Returns:
+            str: The system state, None if no display state was produced.
+        """
+        started = time.perf_counter()
+        try:
+            self.calibration.start_pending(self.sensor_manager)
+            if self.calibration.is_calibration_running:
+                self.calibration.process_frame(self.sensor_manager, records)
+                return None
+            self.sensor_manager.process_frame(records)
+            data = self.display_manager.prepare_display_data()
+            data["SystemState"] = self.sensor_manager.get_system_state()
+            self.publish_snapshot(data, self.display_manager.packed_grid(), self.sensor_manager.display_grid.shape,
+                                  self.sensor_manager.newest_timestamp)
+        except Exception as e:
+            # One bad frame must not stop the detection, the next frame is processed as usual
+            self.failed_frames += 1
+            Logger.error(f"Detection failed for frame of board {self.board}: {e!r}")
+            return None
+        finally:
+            elapsed = time.perf_counter() - started
+            self.frames += 1
+            self.frame_seconds += elapsed
+            self.max_frame_seconds = max(self.max_frame_seconds, elapsed)
+        return data["SystemState"]
+
+    def publish_snapshot(self, data, grid, size, timestamp):
+        """
+        Serializes the display state once and swaps it in as the current snapshot. An unchanged
+        display state keeps the current snapshot, only the timestamp is updated.
+        """
+        current = self.snapshot
+        if (current is not None and current.grid == grid and current.size == tuple(size)
+                and current.state['SystemState'] == data['SystemState']
+                and current.state['components'] == data['components']):
+            self.timestamp = timestamp
+            self.changes.notify()
+            return
+        version = self.snapshot.version + 1 if self.snapshot is not None else 1
+        # The display manager builds new dicts every frame and never changes published ones,
+        # so the snapshot can share them instead of copying the whole state
+        state = dict(data, version=version)
+        snapshot = DisplaySnapshot(version, state, grid, tuple(size), None, f"{self.session}-{version}")
+        if self.serving:
+            snapshot = snapshot._replace(body=encode_compact_state(snapshot))
+            self.history.append(snapshot)
+        else:
+            # Without viewer the body is only serialized on request and no history is kept
+            self.history.clear()
+        # Replacing the references is atomic, readers keep the snapshot they already got
+        self.body_cache = {}
+        self.timestamp = timestamp
+        self.snapshot = snapshot
+        self.changes.notify()
+
+    def get_snapshot(self):
+        """Returns the snapshot of the last processed frame, None before the first frame."""
+        return self.snapshot
+
+    def get_body(self, snapshot, since=None, verbose=False, encoding=None):
+        """
+        Returns the serialized snapshot, or its changes since an earlier version. Falls back to
+        the full snapshot if the earlier version is no longer (or was never) known. Every body
+        is only serialized and compressed once, however many viewers request it.
+
+        Args:
+            snapshot (DisplaySnapshot): The snapshot to serialize.
+            since (int, optional): The version the viewer has.
+            verbose (bool): Whether to use the verbose format instead of the compact one.
+            encoding (str, optional): The content coding, `gzip` or `deflate`.
+
+        Returns:
+            bytes: The response body.
+        """
+        history = list(self.history)
+        if since is not None and (not history or not history[0].version <= since <= snapshot.version):
+            since = None
+        cache = self.body_cache
+        key = (snapshot.version, since, verbose, encoding)
+        body = cache.get(key)
+        if body is not None:
+            return body
+        if encoding is not None:
+            body = compress_body(self.get_body(snapshot, since, verbose), encoding)
+        elif since is None:
+            body = encode_verbose_state(snapshot) if verbose else snapshot.body or encode_compact_state(snapshot)
+        else:
+            old = history[since - history[0].version]
+            body = encode_verbose_delta(old, snapshot) if verbose else encode_compact_delta(old, snapshot)
+        cache[key] = body
+        return body
+
+    def metrics(self):
+        """Returns the processing and serving statistics of the board."""
+        now = time.monotonic()
+        snapshot = self.snapshot
+        return {
+            'board': self.board,
+            'clients': len(self.client_ips),
+            'frames': self.frames,
+            'failed_frames': self.failed_frames,
+            'avg_frame_ms': round(self.frame_seconds / self.frames * 1000, 3) if self.frames else None,
+            'max_frame_ms': round(self.max_frame_seconds * 1000, 3),
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'streams': self.streams,
+            'serving': self.serving,
+            'version': snapshot.version if snapshot is not None else None,
+            'timestamp': self.timestamp,
+            'system_state': snapshot.state['SystemState'] if snapshot is not None else None,
+            'calibration': self.calibration.status()['status'],
+            'uptime': round(now - self.created, 1),
+            'idle': round(now - self.last_used, 1)
+        }
 
-                if level == -1:
-                    self._categorize_negative(address, channel_number, x_coords_negative, y_coords_negative, logic_dim_negative)
-                elif level == 1:
-                    self._categorize_positive(address, channel_number, x_coords_positive, y_coords_positive, logic_dim_positive)
 
-        self._update_display_data(x_dim, y_dim, x_coords_negative, y_coords_negative, logic_dim_negative, 'X', 'XX')
-        self._update_display_data(x_dim, y_dim, x_coords_positive, y_coords_positive, logic_dim_positive, 'O', 'O')
+class BoardRegistry:
+    """
+    Holds the contexts of the boards of the topology. Every board is detected from the start,
+    whether somebody views it or not, so its state is current when it is opened. A board
+    without viewer for `idle_timeout` seconds only releases its serving state (snapshot
+    history and cached bodies) until it is requested again. All boards share the session
+    locator and reader, so the session file is parsed once.
+    """
 
-    @staticmethod
-    def _categorize_negative(address, channel_number, x_neg, y_neg, logic_neg):
-        """Categorizes negative states based on the address."""
-        if address == "10.42.0.1":
-            x_neg.add(channel_number)
-        elif address == "10.42.0.2":
-            y_neg.add(channel_number)
-        elif address == "10.42.0.3":
-            logic_neg.add(channel_number)
+    IDLE_TIMEOUT = 600  # Default seconds without viewer until the serving state of a board is released
+    SWEEP_INTERVAL = 30  # Seconds between two checks for idle boards
 
-    @staticmethod
-    def _categorize_positive(address, channel_number, x_pos, y_pos, logic_pos):
-        """Categorizes positive states based on the address."""
-        if address == "10.42.0.1":
-            x_pos.add(channel_number)
-        elif address == "10.42.0.2":
-            y_pos.add(channel_number)
-        elif address == "10.42.0.3":
-            logic_pos.add(channel_number)
-
-    def _update_display_data(self, x_dim, y_dim, x_coords, y_coords, logic_dim, state, logic_state):
-        """Updates the display data based on detected states."""
-        for x in range(x_dim):
-            for y in range(y_dim):
-                coord_key = f"{x},{y}"
-                if x in x_coords and y in y_coords:
-                    self.sensor_manager.display_data[coord_key]['State'] = state
-                    if y in logic_dim:
-                        self.sensor_manager.display_data[coord_key]['State'] = logic_state
-                        Logger.debug(f"Logical layer detected at {coord_key}")
-
-    def find_components(self, x_dim, y_dim):
-        """Detects components on the display based on known patterns."""
-        component_patterns = {
-            'Transistor': [('X', 'XX', 'X')],
-            'Resistor': [('XX', 'XX')],
-            'Cable': [('X', 'X', 'X')],
-            'LED': [('X', 'X')]
+    def __init__(self, topology, data_dir, idle_timeout=IDLE_TIMEOUT, library=None):
+        self.data_dir = data_dir
+        self.idle_timeout = idle_timeout
+        self.library = library if library is not None else load_component_library(DisplayDataManager.COMPONENT_LIBRARY)
+        self.board_ids = topology.boards()
+        self.topologies = {board: topology.board_topology(board) for board in self.board_ids}
+        self.board_of_address = {client.address: client.board for client in topology.clients}
+        records_per_session = len(topology.clients) * SensorDataManager.MAX_FRAMES
+        self.locator = SessionLocator(data_dir)
+        self.reader = SessionTailReader(window_size=records_per_session, head_size=records_per_session)
+        self.session = format(int(time.time()), 'x')
+        self.contexts = {
+            board: BoardContext(board, self.topologies[board], data_dir, self.library, self.session, self.locator, self.reader)
+            for board in self.board_ids
         }
+        self.releases = 0
+
+    @property
+    def default_board(self):
+        """The board served by the routes without board id."""
+        return self.board_ids[0]
+
+    def get(self, board):
+        """Returns the context of a board, None for unknown boards."""
+        return self.contexts.get(board)
+
+    def for_address(self, address):
+        """Returns the context of the board a client belongs to, None for unknown clients."""
+        return self.contexts.get(self.board_of_address.get(address))
+
+    def release_idle(self):
+        """Releases the serving state of all boards without viewer for longer than the idle timeout."""
+        now = time.monotonic()
+        idle = [board for board, context in self.contexts.items() if context.serving and context.is_idle(now, self.idle_timeout)]
+        for board in idle:
+            self.contexts[board].release()
+            self.releases += 1
+            Logger.info(f"Board {board} released after {self.idle_timeout} s without viewer")
+        return idle
+
+    def start(self):
+        """Starts releasing idle boards in a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(self.SWEEP_INTERVAL)
+            self.release_idle()
 
-        self.required_counts = {
-            'LED': 8,
-            'Resistor': 6,
-            'Transistor': 1,
-            'Cable': 4
+    def metrics(self):
+        """Returns the statistics of the registry and of every board."""
+        contexts = list(self.contexts.values())
+        return {
+            'boards': self.board_ids,
+            'serving': [context.board for context in contexts if context.serving],
+            'releases': self.releases,
+            'idle_timeout': self.idle_timeout,
+            'board_metrics': {context.board: context.metrics() for context in contexts}
         }
 
-        occupied_coords = set()
-        self.check_old_grid(occupied_coords)
-        detected_components = copy.deepcopy(self.old_detected_components)
-        
-        for comp in detected_components.values():
-            occupied_coords.update(comp['coordinates'])
-
-        for x in range(x_dim):
-            for y in range(y_dim):
-                if not self.is_coord_occupied(detected_components, x, y):
-                    for component, pattern in component_patterns.items():
-                        self._detect_component(x, y, x_dim, y_dim, component, pattern, detected_components, occupied_coords)
-
-        return detected_components
-
-    def _detect_component(self, x, y, x_dim, y_dim, component, pattern, detected_components, occupied_coords):
-        """Checks if a specific component pattern is present at the position."""
-        pattern_length = len(pattern[0])
-
-        def update_detection_counter(coords, component_type):
-            key = (component_type, tuple(coords))
-            if key not in self.detection_counter:
-                self.detection_counter[key] = 0
-            self.detection_counter[key] += 1
-            return self.detection_counter[key]
-
-        def is_component_fully_detected(count, component_type):
-            required_count = self.required_counts.get(component_type, 10)
-            return count >= required_count
-
-        # Check horizontal pattern
-        if x + pattern_length - 1 < x_dim:
-            if all(self.sensor_manager.display_data.get(f"{x + i},{y}", {}).get('State') == pattern[0][i]
-                   and (x + i, y) not in occupied_coords for i in range(pattern_length)):
-
-                coordinates = [(x + i, y) for i in range(pattern_length)]
-                count = update_detection_counter(coordinates, component)
-                if is_component_fully_detected(count, component):
-                    comp_id = str(uuid.uuid4())
-                    detected_components[comp_id] = {
-                        'type': component,
-                        'x': x + pattern_length -1,
-                        'y': y,
-                        'orientation': 'horizontal',
-                        'coordinates': coordinates
-                    }
-                    self.detection_counter.clear()
-                    occupied_coords.update(coordinates)
-
-        # Check vertical pattern
-        if y + pattern_length - 1 < y_dim:
-            if all(self.sensor_manager.display_data.get(f"{x},{y + i}", {}).get('State') == pattern[0][i]
-                   and (x, y + i) not in occupied_coords for i in range(pattern_length)):
-
-                coordinates = [(x, y + i) for i in range(pattern_length)]
-                count = update_detection_counter(coordinates, component)
-                if is_component_fully_detected(count, component):
-                    comp_id = str(uuid.uuid4())
-                    detected_components[comp_id] = {
-                        'type': component,
-                        'x': x,
-                        'y': y + pattern_length // 2,
-                        'orientation': 'vertical',
-                        'coordinates': coordinates
-                    }
-                    self.detection_counter.clear()
-                    occupied_coords.update(coordinates)
-
-
-    def check_old_grid(self, occupied_coords):
-        display_data = self.sensor_manager.display_data
-        old_grid_data = self.old_detected_components
-
-        removed_Components_id = []
-
-        if old_grid_data:
-            for id, component_detail in old_grid_data.items():
-                still_existing_component = True
-                for x, y in component_detail['coordinates']:
-                    coord_key = f"{x},{y}"
-                    state = display_data.get(coord_key, {}).get('State')
-                    if state not in ['X', 'XX']:
-                        still_existing_component = False
-                        occupied_coords.discard((x,y))
-                        break
-                if not still_existing_component:
-                    removed_Components_id.append(id)
-            for id in removed_Components_id:
-                del old_grid_data[id]
-
-                Logger.debug(f"Removed component with UUID {id} from old components because it was removed from user.")
-        else:
-            Logger.debug(f"No old Component Grid Data available. It is empty.")
-                    
-    def is_coord_occupied(self, components_dict, x, y):
-        for component in components_dict.values():
-            # Überprüfe, ob 'coordinates' im aktuellen Eintrag vorhanden ist
-            if 'coordinates' in component:
-             # Überprüfe, ob das Koordinatenpaar (x, y) in 'coordinates' enthalten ist
-                if (x, y) in component['coordinates']:
-                 return True
-        return False
 
-    def delete_lifetime(self):
-        """Reduces the lifetime of channels in the channel register and removes expired entries."""
-        for address in list(self.sensor_manager.channel_level_register.keys()):
-            for channel in list(self.sensor_manager.channel_level_register[address].keys()):
-                Logger.debug("Reducing channel lifetime")
-                self.sensor_manager.channel_level_register[address][channel]["lifetime"] -= 1
-                if self.sensor_manager.channel_level_register[address][channel]["lifetime"] <= 0:
-                    del self.sensor_manager.channel_level_register[address][channel]
-                    Logger.debug(f"Removed {address} {channel} from channel_level_register due to expired lifetime")
-            if not self.sensor_manager.channel_level_register[address]:
-                del self.sensor_manager.channel_level_register[address]
+class DetectionWorker:
+    """Runs the detection of all boards once per ingested frame, independent of HTTP requests."""
+
+    RECONNECT_DELAY = 2
+
+    def __init__(self, registry, bus_port):
+        self.registry = registry
+        self.bus_port = bus_port
+        self.sample_interval = None
+        self.gap_statistics = {}
+        self.subscriber = None
+        self.failed_records = 0
+
+    def start(self):
+        """Starts consuming frames in a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """
+        Subscribes to the frame bus and feeds every record into the detector of its board. The
+        subscription is lossless (`block` policy), the hysteresis counts consecutive frames.
+        """
+        while True:
+            subscriber = FrameSubscriber(self.bus_port, policy='block')
+            self.subscriber = subscriber
+            try:
+                subscriber.connect()
+                Logger.info(f"Detection worker subscribed to frame bus on port {self.bus_port}")
+                for record in subscriber:
+                    try:
+                        self.on_record(record)
+                    except Exception as e:
+                        # A malformed record must not end the only detection thread
+                        self.failed_records += 1
+                        Logger.error(f"Detection worker skipped a record: {e!r}")
+            except (OSError, ValueError) as e:
+                Logger.error(f"Frame bus unavailable: {e}")
+            finally:
+                subscriber.close()
+            time.sleep(self.RECONNECT_DELAY)
+
+    def on_record(self, record):
+        """Collects the records of one polling cycle per board and processes them as a frame."""
+        if record.get('type') == 'status':
+            self.sample_interval = record.get('sample_interval', self.sample_interval)
+            self.gap_statistics = record.get('gaps', self.gap_statistics)
+            return
+        context = self.registry.for_address(record.get('pi-address'))
+        if context is None:
+            return
+        for frame in context.add_record(normalize_record(record)):
+            system_state = context.process_frame(frame)
+            if system_state is not None and system_state != "Green":
+                self.report_activity()
+
+    def report_activity(self):
+        """Tells the measurement server that a detection is in progress so it samples faster."""
+        try:
+            self.subscriber.send({'activity': True})
+        except OSError as e:
+            Logger.debug(f"Could not send activity hint: {e}")
 
 
 class AppManager:
-    """Manages the Flask app and its routes."""
+    """
+    Manages the Flask app and its routes. Every board is served below `/board/<board_id>/`,
+    the routes without board id serve the first board of the topology.
+
+    The board state, calibration jobs and snapshot versions live in this process, so the app
+    is served by one multi-threaded process. Several worker processes would each run their
+    own detection and answer with their own versions and entity tags.
+    """
+
+    STREAM_KEEPALIVE = 15  # Seconds between keepalive comments on an idle stream
+    MIN_COMPRESS_SIZE = 256  # Smaller bodies are sent uncompressed, the gzip header would outweigh the gain
     
-    def __init__(self, sensor_manager, display_manager):
-        self.sensor_manager = sensor_manager
-        self.display_manager = display_manager
+    def __init__(self, registry, detection_worker, history):
+        self.registry = registry
+        self.detection_worker = detection_worker
+        self.history = history
         self.app = Flask(__name__)
         CORS(self.app)
         self.setup_routes()
 
     def setup_routes(self):
         """Sets up the Flask routes for the web app."""
-        self.app.add_url_rule('/', 'home', self.home, methods=['GET'])
-        self.app.add_url_rule('/sensor_data', 'get_sensor_data', self.get_sensor_data, methods=['GET'])
-        self.app.add_url_rule('/calibrate', 'start_calibration', self.start_calibration, methods=['GET'])
-        self.app.add_url_rule('/calibration_status', 'get_calibration_status', self.get_calibration_status, methods=['GET'])
+        routes = [
+            ('/', 'home', self.home),
+            ('/sensor_data', 'get_sensor_data', self.get_sensor_data),
+            ('/stream', 'stream', self.stream),
+            ('/calibrate', 'start_calibration', self.start_calibration),
+            ('/calibration_status', 'get_calibration_status', self.get_calibration_status),
+            ('/metrics', 'get_board_metrics', self.get_board_metrics)
+        ]
+        for rule, endpoint, view in routes:
+            self.app.add_url_rule(rule, endpoint, view, methods=['GET'], defaults={'board_id': None})
+            self.app.add_url_rule(f"/board/<board_id>{rule}", f"board_{endpoint}", view, methods=['GET'])
+        self.app.add_url_rule('/boards', 'get_boards', self.get_boards, methods=['GET'])
+        self.app.add_url_rule('/boards/metrics', 'get_metrics', self.get_metrics, methods=['GET'])
+        self.app.add_url_rule('/history', 'get_history', self.get_history, methods=['GET'])
+
+    def get_context(self, board_id):
+        """Returns the context of a board (the default board without id) and marks it as used."""
+        context = self.registry.get(self.registry.default_board if board_id is None else board_id)
+        if context is not None:
+            context.touch()
+        return context
+
+    @staticmethod
+    def is_verbose():
+        """Checks whether the request asks for the verbose format (`?format=verbose`), meant for debugging."""
+        return request.args.get('format') == 'verbose'
+
+    @staticmethod
+    def accepted_encoding():
+        """Returns the preferred content coding the client accepts, None for identity."""
+        for encoding in ('gzip', 'deflate'):
+            if request.accept_encodings[encoding]:
+                return encoding
+        return None
+
+    @staticmethod
+    def unknown_board(board_id):
+        response = jsonify(message=f"Unbekanntes Board: {board_id}")
+        response.status_code = 404
+        return response
     
-    def home(self):
+    def home(self, board_id):
         """Renders the main page of the web application."""
-        config = ConfigManager(CONFIG_PATH)
-        rows = config.get_value('Web-UI', 'amountY-Axis', is_int=True)
-        cols = config.get_value('Web-UI', 'amountX-Axis', is_int=True)
-        return render_template('index.html', rows=rows, cols=cols)
+        context = self.get_context(board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        settings = ConfigManager.shared(CONFIG_PATH).settings
+        rows = settings.y_dim
+        cols = settings.x_dim
+        board_path = '' if board_id is None else f"/board/{board_id}"
+        return render_template('index.html', rows=rows, cols=cols, board_path=board_path)
     
-    def get_sensor_data(self):
+    def get_sensor_data(self, board_id):
         """Provides the current sensor data and its display state."""
-        if CalibrationManager.is_calibration_running:
+        context = self.get_context(board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        if context.calibration.is_active():
             response = jsonify(message="Kalibrierung läuft")
             response.status_code = 423
             return response
+        snapshot = context.get_snapshot()
+        if snapshot is None:
+            response = jsonify(message="Noch keine Messdaten empfangen")
+            response.status_code = 503
+            return response
+        # The entity tag is weak: full state and delta, compact and verbose, compressed or not
+        # are different representations of the same display state
+        if request.if_none_match.contains_weak(snapshot.etag):
+            context.count_not_modified()
+            response = Response(status=304)
         else:
-            self.sensor_manager.process_sensor_data()
-            data = self.display_manager.prepare_display_data()
-
-            system_state = sensor_manager.get_system_state()
-            data["SystemState"] = system_state
-            return jsonify(data)
+            since = request.args.get('since', type=int)
+            verbose = self.is_verbose()
+            body = context.get_body(snapshot, since, verbose)
+            encoding = self.accepted_encoding() if len(body) >= self.MIN_COMPRESS_SIZE else None
+            if encoding is not None:
+                body = context.get_body(snapshot, since, verbose, encoding)
+            response = Response(body, mimetype='application/json')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(snapshot.etag, weak=True)
+        response.headers['X-Measurement-Timestamp'] = context.timestamp or ''
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def stream(self, board_id):
+        """Pushes display state, measurement timestamp and calibration status changes as Server-Sent Events."""
+        context = self.get_context(board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        changes = context.changes
+        verbose = self.is_verbose()
+
+        def events():
+            sent_version = None
+            sent_calibration = None
+            sent_timestamp = None
+            version = changes.version
+            context.count_stream(1)
+            try:
+                while True:
+                    calibration = context.calibration.status()
+                    if calibration != sent_calibration:
+                        sent_calibration = calibration
+                        yield f"event: calibration\ndata: {json.dumps(calibration)}\n\n".encode('utf-8')
+                    snapshot = context.get_snapshot()
+                    if snapshot is not None and snapshot.version != sent_version:
+                        body = context.get_body(snapshot, sent_version, verbose)
+                        sent_version = snapshot.version
+                        yield b"event: display\ndata: " + body + b"\n\n"
+                    timestamp = context.timestamp
+                    if snapshot is not None and timestamp != sent_timestamp:
+                        sent_timestamp = timestamp
+                        yield f"event: timestamp\ndata: {json.dumps({'timestamp': timestamp})}\n\n".encode('utf-8')
+                    new_version = changes.wait(version, self.STREAM_KEEPALIVE)
+                    if new_version == version:
+                        # Keeps proxies from closing the idle connection and detects gone viewers
+                        yield b": keepalive\n\n"
+                    version = new_version
+            finally:
+                context.count_stream(-1)
+
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        return Response(events(), mimetype='text/event-stream', headers=headers)
     
-    def start_calibration(self):
-        """Starts the calibration process."""
-        CalibrationManager.start_calibration(self.sensor_manager)
-        return jsonify(message="Kalibrierung gestartet"), 200
+    def start_calibration(self, board_id):
+        """Queues a calibration job for the detection worker and returns its id without waiting for it."""
+        context = self.get_context(board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        job_id = context.calibration.request_calibration()
+        return jsonify(message="Kalibrierung gestartet", job_id=job_id), 202
     
-    def get_calibration_status(self):
+    def get_calibration_status(self, board_id):
         """Returns the current status of the calibration."""
-        Logger.debug(f"Calibration Status: {CalibrationManager.calibration_status}")
-        return jsonify(CalibrationManager.calibration_status), 200
+        context = self.get_context(board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        status = context.calibration.status()
+        Logger.debug(f"Calibration Status of board {context.board}: {status}")
+        return jsonify(status), 200
+
+    def get_board_metrics(self, board_id):
+        """Returns the processing and serving statistics of a board."""
+        # Reading the metrics must not keep a board serving
+        context = self.registry.get(self.registry.default_board if board_id is None else board_id)
+        if context is None:
+            return self.unknown_board(board_id)
+        return jsonify(context.metrics()), 200
+
+    def get_boards(self):
+        """Lists the boards of the topology and whether somebody views them."""
+        boards = [
+            {'board': board, 'path': f"/board/{board}/", 'clients': context.topology.addresses, 'serving': context.serving}
+            for board, context in self.registry.contexts.items()
+        ]
+        return jsonify(boards=boards, default=self.registry.default_board), 200
+
+    def get_metrics(self):
+        """Returns the statistics of all boards and of the frame bus."""
+        metrics = self.registry.metrics()
+        metrics['sample_interval'] = self.detection_worker.sample_interval
+        metrics['gaps'] = self.detection_worker.gap_statistics
+        metrics['failed_records'] = self.detection_worker.failed_records
+        return jsonify(metrics), 200
     
+    def get_history(self):
+        """
+        Returns the samples of a time range, downsampled on the server. Query parameters:
+        `client` and `channels` (comma separated, default all), `start` and `end` (ISO
+        timestamps, default the whole session), `points` (default 500) and `mode` (`minmax`
+        or `lttb`).
+        """
+        def listed(name):
+            return [value.strip() for values in request.args.getlist(name) for value in values.split(',') if value.strip()] or None
+
+        try:
+            channels = listed('channels')
+            result = self.history.query(
+                addresses=listed('client'),
+                channels=None if channels is None else [int(channel) for channel in channels],
+                start=request.args.get('start'),
+                end=request.args.get('end'),
+                points=request.args.get('points', 500, type=int),
+                mode=request.args.get('mode', 'minmax')
+            )
+        except ValueError as e:
+            response = jsonify(message=f"Ungültige Abfrage: {e}")
+            response.status_code = 400
+            return response
+        body = json.dumps(result, separators=(',', ':')).encode('utf-8')
+        encoding = self.accepted_encoding() if len(body) >= self.MIN_COMPRESS_SIZE else None
+        if encoding is not None:
+            body = compress_body(body, encoding)
+        response = Response(body, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
     def run(self):
-        """Starts the Flask web application."""
-        config = ConfigManager(CONFIG_PATH)
+        """Starts the Flask web application in a single process, requests are handled in threads."""
+        config = ConfigManager.shared(CONFIG_PATH)
         ip_address = config.get_value('Local-Settings', 'local_client_ip')
         port = config.get_value('Network', 'webapp_port', is_int=True)
-        self.app.run(host=ip_address, port=port)
+        self.app.run(host=ip_address, port=port, threaded=True, processes=1)
 
 
 if __name__ == '__main__':
@@ -568,7 +1215,16 @@ if __name__ == '__main__':
     LOG_FILE = 'resistectorUI.log'
 
     logger = Logger(LOG_DIR, LOG_FILE)
-    sensor_manager = SensorDataManager(DATA_DIR)
-    display_manager = DisplayDataManager(sensor_manager)
-    app_manager = AppManager(sensor_manager, display_manager)
+    config = ConfigManager.shared(CONFIG_PATH)
+    topology = load_topology(config.config)
+    idle_timeout = float(ConfigManager.clean_value(config.config['Web-UI'].get('board_idle_timeout', str(BoardRegistry.IDLE_TIMEOUT))))
+    # Every board is detected from startup, boards without viewer release their serving state after the idle timeout
+    registry = BoardRegistry(topology, DATA_DIR, idle_timeout)
+    registry.start()
+    history = HistoryStore(topology, SessionLocator(DATA_DIR))
+    history.start()
+    bus_port = config.get_value('Network', 'bus_port', is_int=True)
+    detection_worker = DetectionWorker(registry, bus_port)
+    detection_worker.start()
+    app_manager = AppManager(registry, detection_worker, history)
     app_manager.run()
@@ -13,15 +13,17 @@ document.addEventListener('DOMContentLoaded', () => {
     const finishButton = document.getElementById('finishButton');
     
     let calibrationIsRunning = false;
-    let fetchDataInterval, fetchTimestampInterval;
+    let fetchDataInterval, fetchTimestampInterval, calibrationStatusInterval;
+    let eventSource = null;
+    let updatesPaused = false;
+    let displayVersion = null;
+    let displayEtag = null;
     let latestDate = null;
     let showDetails = false;
 
     setupGrid();
-    fetchData();
-    fetchDataInterval = setInterval(fetchData, 1000);
     fetchTimestampInterval = setInterval(updateTimestampStatus, 1000);
-    setInterval(checkCalibrationStatus, 1000);
+    connectStream();
 
     toggleBtn.addEventListener('click', toggleSidebar);
     toggleDetailsCheckbox.addEventListener('change', toggleDetails);
@@ -73,14 +75,64 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function connectStream() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        eventSource = new EventSource(`${boardPath}/stream`);
+        eventSource.addEventListener('display', event => {
+            if (!updatesPaused) {
+                handleResponseData(JSON.parse(event.data));
+            }
+        });
+        eventSource.addEventListener('timestamp', event => {
+            if (!updatesPaused) {
+                updateTimestamp(JSON.parse(event.data).timestamp);
+            }
+        });
+        eventSource.addEventListener('calibration', event => {
+            handleCalibrationStatus(JSON.parse(event.data));
+        });
+        eventSource.onerror = () => {
+            // The browser reconnects by itself, a closed stream means streaming is unavailable
+            if (eventSource.readyState === EventSource.CLOSED) {
+                eventSource = null;
+                startPolling();
+            }
+        };
+    }
+
+    function startPolling() {
+        console.warn('Streaming unavailable, falling back to polling');
+        fetchData();
+        if (!updatesPaused) {
+            fetchDataInterval = setInterval(fetchData, 1000);
+        }
+        calibrationStatusInterval = setInterval(checkCalibrationStatus, 1000);
+    }
+
     function fetchData() {
-        fetch('/sensor_data')
+        // Only the changes since the shown version are transferred, nothing if it is still current
+        const url = displayVersion === null ? `${boardPath}/sensor_data` : `${boardPath}/sensor_data?since=${displayVersion}`;
+        const headers = displayEtag ? { 'If-None-Match': displayEtag } : {};
+        fetch(url, { headers, cache: 'no-store' })
             .then(handleFetchResponse)
             .then(handleResponseData)
             .catch(handleFetchError);
     }
 
     function handleFetchResponse(response) {
+        // The timestamp is sent as header, it changes with every frame but does not make the display state new
+        if (response.headers.get('X-Measurement-Timestamp')) {
+            updateTimestamp(response.headers.get('X-Measurement-Timestamp'));
+        }
+
+        if (response.status === 304) {
+            return null;
+        }
+
         if (response.status === 423) {
             return response.json().then(responseData => {
                 console.error('Resource is currently locked:', responseData);
@@ -99,23 +151,70 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         }
 
+        displayEtag = response.headers.get('ETag');
         return response.json();
     }
 
     function handleResponseData(responseData) {
-        const data = responseData?.data || responseData;
+        if (responseData === null) {
+            return;
+        }
+
+        const data = expandCompactData(responseData?.data || responseData);
 
         if (!data || !Object.keys(data).length) {
             console.error('Data is undefined, null, or empty');
             return;
         }
 
-        resetCircles();
+        if (data.delta && data.since !== displayVersion) {
+            resyncDisplay();
+            return;
+        }
+
+        if (!data.delta) {
+            resetCircles();
+        }
         updateCirclesWithData(data);
-        updateTimestamp(responseData);
+        displayVersion = data.version ?? null;
         updateSystemState(responseData);
     }
 
+    function expandCompactData(data) {
+        // The compact format packs the grid into one string of state codes, row by row
+        if (!data || data.format !== 'compact') {
+            return data;
+        }
+        const states = ['O', 'X', 'XX'];
+        const [width] = data.size;
+        const displayData = {};
+        if (data.delta) {
+            for (let i = 0; i < data.cells.length; i += 2) {
+                const index = data.cells[i];
+                displayData[`${index % width},${Math.floor(index / width)}`] = { State: states[data.cells[i + 1]] };
+            }
+        } else {
+            for (let index = 0; index < data.grid.length; index++) {
+                displayData[`${index % width},${Math.floor(index / width)}`] = { State: states[data.grid.charCodeAt(index) - 48] };
+            }
+        }
+        const components = {};
+        data.components.forEach(([id, type, x, y, orientation]) => {
+            components[id] = { type, x, y, orientation: orientation === 'h' ? 'horizontal' : 'vertical' };
+        });
+        return { ...data, displayData, components, removedComponents: data.removed };
+    }
+
+    function resyncDisplay() {
+        // The update does not fit the shown state, the next one has to be a full state
+        displayVersion = null;
+        displayEtag = null;
+        if (eventSource) {
+            eventSource.close();
+            connectStream();
+        }
+    }
+
     function resetCircles() {
         const circles = document.getElementsByClassName('circle');
         Array.from(circles).forEach(circle => {
@@ -139,15 +238,21 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
 
-        updateComponents(data.components);
+        updateComponents(data.components, data.removedComponents);
     }
 
-    function updateComponents(components) {
-        removeExistingComponents();
+    function updateComponents(components, removedComponents) {
+        if (removedComponents) {
+            removedComponents.forEach(removeComponent);
+        } else {
+            removeExistingComponents();
+        }
 
         Object.entries(components).forEach(([key, component]) => {
+            removeComponent(key);
             const img = document.createElement('img');
-            img.src = `static/Bauteilbilder/${component.type}.png`;
+            img.dataset.id = key;
+            img.src = `${staticPath}Bauteilbilder/${component.type}.png`;
             img.className = 'component';
             img.style.position = 'absolute';
 
@@ -161,6 +266,13 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    function removeComponent(key) {
+        const img = gridContainer.querySelector(`img.component[data-id='${key}']`);
+        if (img) {
+            img.remove();
+        }
+    }
+
     function removeExistingComponents() {
         const componentImages = document.getElementsByClassName('component');
         while (componentImages[0]) {
@@ -220,8 +332,8 @@ document.addEventListener('DOMContentLoaded', () => {
         return stateColors[state] || stateColors.default;
     }
 
-    function updateTimestamp(responseData) {
-        latestDate = responseData.timestamp;
+    function updateTimestamp(timestamp) {
+        latestDate = timestamp;
         timestampContainer.textContent = `MeasurementData Timestamp: ${new Date(latestDate).toLocaleString()}`;
         updateTimestampStatus();
     }
@@ -286,44 +398,50 @@ document.addEventListener('DOMContentLoaded', () => {
     function handleCalibrate() {
         stopProcesses();
         modal.style.display = 'block';
-        fetch('/calibrate')
+        fetch(`${boardPath}/calibrate`)
             .then(response => response.json())
             .catch(error => console.error('Error:', error));
         checkCalibrationStatus();
     }
 
     function checkCalibrationStatus() {
-        fetch('/calibration_status')
+        fetch(`${boardPath}/calibration_status`)
             .then(response => response.json())
-            .then(data => {
-                if (data.status === 'Completed') {
-                    calibrationIsRunning = false;
-                    modalText.textContent = 'Calibration finished. Please continue';
-                    finishButton.style.display = 'block';
-                } else if (data.status === 'Not Started') {
-                    calibrationIsRunning = false;
-                } else {
-                    calibrationIsRunning = true;
-                    modalText.textContent = 'Calibration is running. Please wait';
-                    finishButton.style.display = 'none';
-                }
-            })
+            .then(handleCalibrationStatus)
             .catch(error => console.error('Error:', error));
     }
 
+    function handleCalibrationStatus(data) {
+        if (data.status === 'Completed') {
+            calibrationIsRunning = false;
+            modalText.textContent = 'Calibration finished. Please continue';
+            finishButton.style.display = 'block';
+        } else if (data.status === 'Not Started') {
+            calibrationIsRunning = false;
+        } else {
+            calibrationIsRunning = true;
+            modalText.textContent = 'Calibration is running. Please wait';
+            finishButton.style.display = 'none';
+        }
+    }
+
     function finishCalibration() {
         startProcesses();
         modal.style.display = 'none';
     }
 
     function stopProcesses() {
+        updatesPaused = true;
         clearInterval(fetchDataInterval);
         clearInterval(fetchTimestampInterval);
         timestampContainer.innerHTML = 'Calibration in progress &#9888;';
     }
 
     function startProcesses() {
-        fetchDataInterval = setInterval(fetchData, 1000);
+        updatesPaused = false;
+        if (!eventSource) {
+            fetchDataInterval = setInterval(fetchData, 1000);
+        }
         fetchTimestampInterval = setInterval(updateTimestampStatus, 1000);
     }
 });
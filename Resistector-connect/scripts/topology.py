@@ -0,0 +1,191 @@
+import re
+from collections import namedtuple
+import numpy as np
+
+AXES = ('x', 'y')
+LAYERS = ('bb', 'll1')
+DEFAULT_ROLES = ['axis:x, layer:bb', 'axis:y, layer:bb', 'axis:y, layer:ll1, filter:10-22']  # Legacy client_ips order: X Y LL
+
+ClientRole = namedtuple('ClientRole', ['address', 'index', 'axis', 'layer', 'offset', 'board', 'channels', 'filter_range'])
+ClientRole.__doc__ = """
+Role of one measurement client.
+
+Attributes:
+    address (str): The IP address of the client.
+    index (int): Position of the client in the topology, used as row in per-client arrays.
+    axis (str): The axis the channels of the client measure, `x` or `y`.
+    layer (str): The layer the client measures, `bb` (breadboard) or `ll1` (logic layer 1).
+    offset (int): Grid coordinate of the first channel of the client on its axis.
+    board (str): The id of the board the client belongs to.
+    channels (int): The number of channels of the client.
+    filter_range (tuple): Valid (min, max) range of the server threshold filter, None to
+        only apply the EMA filter.
+"""
+
+
+def clean_value(value):
+    """
+    Cleans a configuration value by removing comments and extra whitespace. Shared by
+    the measurement server and the web UI.
+
+    Args:
+        value (str): The value to be cleaned.
+
+    Returns:
+        str: The cleaned value.
+    """
+    return value.split(';')[0].split('#')[0].strip()
+
+
+_CHANNEL_NUMBER = re.compile(r'\d+')
+_channel_indices = {}
+
+
+def channel_index(channel):
+    """
+    Returns the channel number of a channel name like `Channel 3`. The result is cached,
+    so the name is only parsed once.
+
+    Args:
+        channel (str): The channel name.
+
+    Returns:
+        int: The channel number.
+    """
+    index = _channel_indices.get(channel)
+    if index is None:
+        match = _CHANNEL_NUMBER.search(channel)
+        if match is None:
+            raise ValueError(f"Channel name without number: {channel}")
+        index = _channel_indices[channel] = int(match.group())
+    return index
+
+
+def _parse_role(address, index, value, default_channels):
+    options = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        key, _, option = part.partition(':')
+        options[key.strip().lower()] = option.strip()
+
+    axis = options.get('axis', '').lower()
+    layer = options.get('layer', 'bb').lower()
+    if axis not in AXES:
+        raise ValueError(f"Invalid topology for {address}: axis has to be one of {AXES}")
+    if layer not in LAYERS:
+        raise ValueError(f"Invalid topology for {address}: layer has to be one of {LAYERS}")
+
+    offset = int(options.get('offset', 0))
+    if offset < 0:
+        raise ValueError(f"Invalid topology for {address}: offset must not be negative")
+
+    filter_range = None
+    if options.get('filter'):
+        low, _, high = options['filter'].partition('-')
+        filter_range = (float(low), float(high))
+
+    return ClientRole(
+        address=address,
+        index=index,
+        axis=axis,
+        layer=layer,
+        offset=offset,
+        board=options.get('board', '0'),
+        channels=int(options.get('channels', default_channels)),
+        filter_range=filter_range
+    )
+
+
+class Topology:
+    """
+    The client topology compiled into lookup tables.
+
+    Attributes:
+        clients (list): The ClientRole of every client, in configuration order.
+        addresses (list): The client addresses, in configuration order.
+        roles (dict): The ClientRole per client address.
+        axis_codes (numpy.ndarray): Per client index 0 for the x axis and 1 for the y axis.
+        layer_codes (numpy.ndarray): Per client index 0 for the breadboard and 1 for the logic layer.
+        offsets (numpy.ndarray): Per client index the grid coordinate of its first channel.
+        max_channels (int): The largest channel count of all clients.
+    """
+
+    def __init__(self, clients):
+        if not clients:
+            raise ValueError("The topology contains no clients")
+        self.clients = list(clients)
+        self.addresses = [client.address for client in self.clients]
+        self.roles = {client.address: client for client in self.clients}
+        self.axis_codes = np.array([AXES.index(client.axis) for client in self.clients], dtype=np.int8)
+        self.layer_codes = np.array([LAYERS.index(client.layer) for client in self.clients], dtype=np.int8)
+        self.offsets = np.array([client.offset for client in self.clients], dtype=np.int32)
+        self.max_channels = max(client.channels for client in self.clients)
+
+    def role(self, address):
+        """
+        Returns the role of a client.
+
+        Args:
+            address (str): The IP address of the client.
+
+        Returns:
+            ClientRole: The role, None for clients that are not part of the topology.
+        """
+        return self.roles.get(address)
+
+    def boards(self):
+        """
+        Returns the ids of all boards, in configuration order.
+
+        Returns:
+            list: The board ids.
+        """
+        return list(dict.fromkeys(client.board for client in self.clients))
+
+    def board_topology(self, board):
+        """
+        Returns the topology restricted to the clients of one board.
+
+        Args:
+            board (str): The board id.
+
+        Returns:
+            Topology: The topology of the board.
+        """
+        clients = [client for client in self.clients if client.board == board]
+        return Topology([client._replace(index=index) for index, client in enumerate(clients)])
+
+
+def load_topology(config):
+    """
+    Compiles the `Topology` section of the configuration. Every option maps a client
+    address to its role, e.g. `10.42.0.3 = axis:y, layer:ll1, offset:0, board:0, filter:10-22`.
+    Without a `Topology` section the roles are derived from the order of `client_ips`
+    (X axis, Y axis, logic layer), more than three clients need a `Topology` section.
+
+    Args:
+        config (configparser.ConfigParser): The configuration object.
+
+    Returns:
+        Topology: The compiled topology.
+
+    Raises:
+        ValueError: If a role is invalid or `client_ips` lists more clients than there are
+            legacy roles.
+    """
+    default_channels = 8
+    if 'Local-Settings' in config and 'channelList' in config['Local-Settings']:
+        default_channels = len(clean_value(config['Local-Settings']['channelList']).split(','))
+
+    if 'Topology' in config and len(config['Topology']):
+        entries = [(address, clean_value(value)) for address, value in config['Topology'].items()]
+    else:
+        addresses = [clean_value(ip) for ip in clean_value(config['Network']['client_ips']).split(',')]
+        if len(addresses) > len(DEFAULT_ROLES):
+            raise ValueError(f"client_ips lists {len(addresses)} clients, without a [Topology] section only "
+                             f"{len(DEFAULT_ROLES)} (X axis, Y axis, logic layer) are supported: {addresses[len(DEFAULT_ROLES):]} "
+                             f"would not be polled. Describe every client in [Topology].")
+        entries = list(zip(addresses, DEFAULT_ROLES))
+
+    return Topology([_parse_role(address, index, value, default_channels) for index, (address, value) in enumerate(entries)])